@@ -6,11 +6,14 @@ from app.ui.Design import Ui_MainWindow
 from app.services.files_setup import FeatureFoldersProcessor
 from app.services.upload_wav import AudioFileUploader
 from app.models.fingerprint_matcher import SongMatcher
+from app.models.stem_router import StemRouter
 from app.services.song_mixer import SongMixer
+from app.services.catalog_watcher import CatalogWatcher
+from app.services.catalog_shards import ShardedCatalog
 
 
 class MainWindowController(QtWidgets.QMainWindow):
-    def __init__(self, app):
+    def __init__(self, app, num_shards=None):
         super().__init__()
         self.app = app
         self.ui = Ui_MainWindow()
@@ -21,6 +24,17 @@ class MainWindowController(QtWidgets.QMainWindow):
         # Create a processor for features/fingerprints; it scans folders upon init
         self.service = FeatureFoldersProcessor()
 
+        # Pick up songs dropped into the catalog while the app is running
+        self.catalog_watcher = CatalogWatcher(self.service)
+        self.catalog_watcher.start()
+
+        # Stem router calibrated on the catalog snapshot it was built from
+        self.router, self.router_snapshot = None, None
+
+        # Optionally score queries in parallel shard workers, reloaded when the snapshot changes
+        self.shards = ShardedCatalog(self.service.fingerprints_path, num_shards) if num_shards else None
+        self.shards_snapshot = self.service.snapshot
+
         # Initialize mixer filepaths
         self.mixer_filepath01 = None
         self.mixer_filepath02 = None
@@ -33,6 +47,7 @@ class MainWindowController(QtWidgets.QMainWindow):
         self.ui.reset_button.clicked.connect(self.reset_filepaths)
         self.ui.songs_weight_slider.valueChanged.connect(self.ui.update_song_weight_slider_label)
         self.ui.songs_weight_slider.sliderReleased.connect(self.generate_mixed_song)
+        self.ui.table_filter_input.textChanged.connect(self.ui.filter_index_table)
 
         self.reset_filepaths()
 
@@ -42,14 +57,23 @@ class MainWindowController(QtWidgets.QMainWindow):
             self.match_and_display_similar_songs(file_path)
 
     def match_and_display_similar_songs(self, file_path):
-        # Create a SongMatcher with the new audio file & known fingerprints
-        self.matcher = SongMatcher(file_path, self.service.all_fingerprints)
+        # Take one snapshot so a concurrent catalog refresh cannot mix old and new data
+        snapshot = self.service.snapshot
+        if self.router_snapshot is not snapshot:
+            self.router, self.router_snapshot = StemRouter.from_catalog(snapshot.signatures), snapshot
+        if self.shards is not None and self.shards_snapshot is not snapshot:
+            # The catalog files are saved before a new snapshot is swapped in
+            self.shards.reload()
+            self.shards_snapshot = snapshot
 
-        # Compute all similarities
-        similarity_list = self.matcher.compute_all_similarities()
+        # Create a SongMatcher with the new audio file & known fingerprints
+        self.matcher = SongMatcher(
+            file_path, snapshot.fingerprints, snapshot.signatures, snapshot.augmented,
+            router=self.router, shards=self.shards
+        )
 
-        # Sort the list by similarity index (descending order)
-        Table = sorted(similarity_list, key=lambda x: x[1], reverse=True)
+        # Compute all similarities, already ranked (fine-scored entries before pruned ones)
+        Table = self.matcher.compute_all_similarities()
 
         # Clear any previous entries in the UI table
         self.ui.clear_index_table_data()
@@ -59,19 +83,15 @@ class MainWindowController(QtWidgets.QMainWindow):
             self.ui.update_recognized_song_data("No match found")
             return
 
-        _, _, best_match_song_type = Table[0]
-        # Populate the table with results
-        for song_name, similarity_index, song_type in Table:
-            # if best_match_song_type == song_type:
-            self.ui.add_row_to_index_table(
-                    song_name,
-                    f"{similarity_index * 100:.2f}%",  # Convert to percentage
-                    song_type
-                )
+        # Populate the table with results in a single model reset
+        self.ui.set_index_table_data(Table, refined=self.matcher.refined)
 
-        # The top match (first in sorted list) is the recognized song
-        best_match, _, _ = Table[0]
-        self.ui.update_recognized_song_data(best_match)
+        # The top match is only reported when it clears the confidence thresholds
+        result = self.matcher.get_match_result()
+        if not result["is_match"]:
+            self.ui.update_recognized_song_data("No match found")
+            return
+        self.ui.update_recognized_song_data(result["song_name"])
 
     def set_mixer_first_song_filepath(self):
         file_path = AudioFileUploader().upload_audio_signal_file()
@@ -122,5 +142,8 @@ class MainWindowController(QtWidgets.QMainWindow):
             self.match_and_display_similar_songs(path)
 
     def quit_app(self):
+        self.catalog_watcher.stop()
+        if self.shards is not None:
+            self.shards.close()
         self.app.quit()
         remove_directories()
@@ -1,35 +1,106 @@
-import librosa
 import numpy as np
-import matplotlib.pyplot as plt
-from PIL import Image
-import imagehash
 from io import BytesIO
 
+from app.models.spectrogram_analysis import SpectrogramAnalysis
+from app.models.spectrogram_engine import DEFAULT_ENGINE
+from app.utils.dtype_policy import AUDIO_DTYPE
+from app.utils.wav_reader import open_mapped_wav
+
+# librosa, matplotlib, PIL and imagehash are imported on first use: together they
+# dominate application start-up, and matplotlib is optional for query-only installs.
+
+# Bump whenever a change alters features, fingerprints or signatures; stored catalogs and
+# index bundles from another version are not comparable
+EXTRACTOR_VERSION = "2"
+
+# Frequency range (Hz) where most vocal energy sits
+VOCAL_BAND = (300, 3400)
+
+# Luma of the viridis colormap at evenly spaced points, used when matplotlib is unavailable
+VIRIDIS_LUMA = [30.5, 81.6, 111.0, 157.3, 215.4]
+
+
+def has_matplotlib():
+    """Return True if matplotlib can be imported."""
+    try:
+        import matplotlib  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def extractor_version():
+    """
+    Version stamped on saved catalogs and index bundles: EXTRACTOR_VERSION plus the spectrogram
+    renderer. Hashes of the fallback render differ from the matplotlib render's (about 3% of the
+    bits on the bundled songs), so data from the two renderers is never mixed.
+    """
+    return f"{EXTRACTOR_VERSION}+{'agg' if has_matplotlib() else 'luma'}"
+
 
 class FeatureExtractor:
-    def generate_mel_spectrogram(self, file_path, duration=30, sr=None, n_mels=128):
+    def generate_mel_spectrogram(self, file_path, duration=30, sr=None, n_mels=128, dtype=AUDIO_DTYPE):
         """
         Generate a log-scaled Mel spectrogram for a given audio file.
+        The signal and the spectrogram are kept in `dtype` (float32 by default).
         """
         try:
-            y, sr = librosa.load(file_path, sr=sr, duration=duration)
-            mel_spectrogram = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=n_mels)
-            log_mel_spectrogram = librosa.power_to_db(mel_spectrogram, ref=np.max)
-            return log_mel_spectrogram, sr
+            y, sr = self.load_audio(file_path, sr=sr, duration=duration, dtype=dtype)
+            return self.mel_spectrogram_from_signal(y, sr, n_mels=n_mels, dtype=dtype), sr
         except Exception as e:
             print(f"Error generating mel spectrogram: {e}")
             return None, None
 
-    def extract_features(self, spectrogram, sr):
+    def mel_spectrogram_from_signal(self, y, sr, n_mels=128, dtype=AUDIO_DTYPE):
+        """
+        Log-scaled Mel spectrogram of an in-memory signal; (frames, channels) input is mixed down to mono.
+        """
+        y = np.asarray(y, dtype=dtype)
+        if y.ndim > 1:
+            y = y.mean(axis=1)
+
+        # The cached float32 engine reuses filterbanks and windows across files
+        if np.dtype(dtype) == np.dtype(AUDIO_DTYPE):
+            return DEFAULT_ENGINE.log_melspectrogram(y, sr, n_mels=n_mels)
+
+        import librosa
+        mel_spectrogram = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=n_mels)
+        log_mel_spectrogram = librosa.power_to_db(mel_spectrogram, ref=np.max)
+        return log_mel_spectrogram.astype(dtype, copy=False)
+
+    def load_audio(self, file_path, sr=None, duration=None, dtype=AUDIO_DTYPE):
+        """
+        Load a mono signal. PCM/float WAVs at their native rate are memory-mapped so only
+        the first `duration` seconds are read and converted; everything else goes through librosa.
+        """
+        wav = open_mapped_wav(file_path) if sr is None else None
+        if wav is not None:
+            return wav.read_seconds(duration=duration, dtype=dtype, mono=True), wav.samplerate
+
+        import librosa
+        return librosa.load(file_path, sr=sr, duration=duration, dtype=dtype)
+
+    def analyze(self, spectrogram, sr):
+        """
+        Wrap a spectrogram in a SpectrogramAnalysis that caches every derived representation.
+        """
+        return SpectrogramAnalysis(spectrogram, sr, self)
+
+    def extract_features(self, spectrogram, sr, analysis=None):
         """
         Extract a variety of features from a log-scaled Mel spectrogram.
+        Pass an `analysis` to reuse its cached amplitude, chroma and MFCCs.
         """
         if spectrogram is None or sr is None:
             return {}
 
         features = {}
         try:
-            amplitude_spectrogram = librosa.db_to_amplitude(spectrogram)
+            import librosa
+
+            if analysis is None:
+                analysis = self.analyze(spectrogram, sr)
+            amplitude_spectrogram = analysis.amplitude
 
             # Spectral features
             features['spectral_centroid_mean'] = float(np.mean(
@@ -46,8 +117,7 @@ class FeatureExtractor:
             ))
 
             # Tonal features
-            chroma = librosa.feature.chroma_stft(S=amplitude_spectrogram, sr=sr)
-            tonnetz = librosa.feature.tonnetz(chroma=chroma, sr=sr)
+            tonnetz = librosa.feature.tonnetz(chroma=analysis.chroma, sr=sr)
             features['tonnetz_mean'] = float(np.mean(tonnetz))
 
             # Temporal features
@@ -55,7 +125,7 @@ class FeatureExtractor:
             features['zero_crossing_rate_mean'] = float(np.mean(zero_crossings))
 
             # MFCCs
-            mfcc = librosa.feature.mfcc(S=spectrogram, sr=sr, n_mfcc=13)
+            mfcc = analysis.mfcc
             for i in range(mfcc.shape[0]):
                 features[f'mfcc_{i}_mean'] = float(np.mean(mfcc[i, :]))
 
@@ -66,33 +136,128 @@ class FeatureExtractor:
 
         return features
 
-    def generate_perceptual_hash(self, spectrogram):
+    def render_spectrogram_image(self, spectrogram):
+        """
+        Render a spectrogram to an in-memory image, as used by the perceptual hashes.
+        Without matplotlib a grayscale approximation of the same render is used; its hashes
+        are not interchangeable with the matplotlib render's, see extractor_version().
+        """
+        from PIL import Image
+
+        if not has_matplotlib():
+            return self._render_without_matplotlib(spectrogram)
+
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        # Create a spectrogram image in memory; a bare Agg figure skips pyplot's
+        # figure manager (a GUI window object under the Qt backend)
+        fig = Figure(figsize=(5, 5), dpi=100)
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        ax.axis('off')  # Remove axes
+        ax.imshow(spectrogram, aspect='auto', origin='lower', cmap='viridis')
+
+        # Save the image to a BytesIO buffer
+        buf = BytesIO()
+        fig.savefig(buf, format='png', bbox_inches='tight', pad_inches=0)
+        buf.seek(0)
+
+        # Load the image from the buffer so the buffer can be released
+        image = Image.open(buf)
+        image.load()
+        buf.close()
+        return image
+
+    def _render_without_matplotlib(self, spectrogram):
+        """
+        Map the spectrogram through the luma of viridis, bottom row first like origin='lower'.
+        pHash only looks at the grayscale image, so this is close to the matplotlib render.
+        """
+        from PIL import Image
+
+        data = np.asarray(spectrogram, dtype=np.float64)
+        span = data.max() - data.min()
+        scaled = (data - data.min()) / span if span else np.zeros_like(data)
+        luma = np.interp(scaled, np.linspace(0, 1, len(VIRIDIS_LUMA)), VIRIDIS_LUMA)
+        return Image.fromarray(np.flipud(luma).astype(np.uint8), mode="L")
+
+    def generate_perceptual_hash(self, spectrogram, image=None, hash_size=8):
         """
         Generate a perceptual hash (pHash) from a spectrogram without saving the image.
+        The default hash_size of 8 gives the 64-bit catalog fingerprint; 16 gives the 256-bit fine signature.
         """
         try:
-            # Create a spectrogram image in memory
-            fig, ax = plt.subplots(figsize=(5, 5), dpi=100)
-            ax.axis('off')  # Remove axes
-            ax.imshow(spectrogram, aspect='auto', origin='lower', cmap='viridis')
-
-            # Save the image to a BytesIO buffer
-            buf = BytesIO()
-            plt.savefig(buf, format='png', bbox_inches='tight', pad_inches=0)
-            plt.close(fig)
-            buf.seek(0)
-
-            # Load the image from the buffer and compute its hash
-            image = Image.open(buf)
-            phash = imagehash.phash(image)
-            buf.close()
+            import imagehash
 
+            if image is None:
+                image = self.render_spectrogram_image(spectrogram)
+            phash = imagehash.phash(image, hash_size=hash_size)
             return str(phash)
 
         except Exception as e:
             print(f"Error generating perceptual hash: {e}")
             return None
 
+    def generate_coarse_signature(self, spectrogram, time_bins=4, freq_bins=4):
+        """
+        Generate a short band-energy hash: the spectrogram is averaged over a
+        time x frequency grid and each cell contributes one bit (above/below the mean
+        of its frequency band). Comparing within a band keeps the bits about how the
+        song changes over time; a global threshold mostly encodes the low-frequency
+        tilt every song shares.
+        """
+        try:
+            time_groups = np.array_split(np.asarray(spectrogram), time_bins, axis=1)
+            energies = np.array([
+                [np.mean(band) for band in np.array_split(group, freq_bins, axis=0)]
+                for group in time_groups
+            ])
+
+            bits = (energies > energies.mean(axis=0, keepdims=True)).flatten()
+            value = int("".join("1" if bit else "0" for bit in bits), 2)
+            return f"{value:0{(bits.size + 3) // 4}x}"
+
+        except Exception as e:
+            print(f"Error generating coarse signature: {e}")
+            return None
+
+    def vocal_energy_ratio(self, spectrogram, sr):
+        """Share of the mel spectrogram's power that falls inside VOCAL_BAND."""
+        import librosa
+
+        power = librosa.db_to_power(np.asarray(spectrogram, dtype=np.float64))
+        band_energy = power.sum(axis=1)
+        frequencies = librosa.mel_frequencies(n_mels=len(band_energy) + 2, fmax=sr / 2)[1:-1]
+        in_band = (frequencies >= VOCAL_BAND[0]) & (frequencies <= VOCAL_BAND[1])
+        total = band_energy.sum()
+        return float(band_energy[in_band].sum() / total) if total > 0 else 0.0
+
+    def generate_signatures(self, spectrogram, image=None, sr=None):
+        """
+        Generate the coarse and fine signatures used by the cascade matcher.
+        With `sr`, the vocal-band energy ratio used by the stem router is included too.
+        """
+        try:
+            if image is None:
+                image = self.render_spectrogram_image(spectrogram)
+        except Exception as e:
+            print(f"Error generating signatures: {e}")
+            return None
+
+        coarse = self.generate_coarse_signature(spectrogram)
+        fine = self.generate_perceptual_hash(spectrogram, image=image, hash_size=16)
+        if not coarse or not fine:
+            return None
+        signatures = {"coarse": coarse, "fine": fine}
+
+        if sr is not None:
+            try:
+                signatures["vocal_ratio"] = round(self.vocal_energy_ratio(spectrogram, sr), 4)
+            except Exception as e:
+                print(f"Error computing vocal energy ratio: {e}")
+        return signatures
+
     def _normalize_features(self, features):
         """
         Normalize feature values to a range of [0, 1].
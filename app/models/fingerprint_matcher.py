@@ -1,48 +1,454 @@
+import math
+import os
+import numpy as np
+
 from app.models.feature_extractor import FeatureExtractor
+from app.utils.job_scheduler import QUERY, estimate_decode_bytes, get_scheduler
+from app.utils.profiling import profiled
+
+# Share of the catalog kept after the coarse pass, and the minimum number of survivors
+COARSE_KEEP_RATIO = 0.25
+COARSE_MIN_CANDIDATES = 10
+
+# Upper bound for the temporary arrays of one batched matching pass, in bytes
+MATCH_MEMORY_BUDGET = 64 * 1024 * 1024
+
+# A best match below this confidence, or ahead of the best other song by less than
+# this similarity margin, is reported as "no match"
+MIN_MATCH_CONFIDENCE = 0.9
+MIN_MATCH_MARGIN = 0.05
+# Matching stops refining candidates once one reaches this confidence under the chance background
+EARLY_EXIT_CONFIDENCE = 0.999999
+# Fewer non-top scores than this and the background falls back to the chance rate
+MIN_BACKGROUND_SCORES = 5
+# Per-position match probability of unrelated hashes: hex characters and bits
+CHARACTER_CHANCE = 1 / 16
+BIT_CHANCE = 0.5
+
+
+def compute_similarity(fingerprint1, fingerprint2):
+    """Compute a similarity metric between two perceptual hashes."""
+    # Use Hamming distance for perceptual hashes
+    return sum(c1 == c2 for c1, c2 in zip(fingerprint1, fingerprint2)) / max(len(fingerprint1), len(fingerprint2))
+
+
+def hamming_similarity(hash1, hash2):
+    """Bitwise similarity between two equal-length hex hashes (1.0 means identical)."""
+    bits = len(hash1) * 4
+    return 1 - bin(int(hash1, 16) ^ int(hash2, 16)).count("1") / bits
+
+
+def score_fingerprints(fingerprint, all_fingerprints, augmented=None, early_exit=None):
+    """
+    Score a fingerprint against a {song_name: {file_type: fingerprint}} mapping.
+    With `augmented` ({song_name: {file_type: {variant: {"fingerprint", "coarse", "fine"}}}}),
+    each entry scores the best of its clean fingerprint and its distorted variants.
+    With `early_exit`, the scan stops at the first entry scoring at least that similarity.
+    Returns (song_name, similarity, file_type) tuples sorted by similarity, highest first.
+    """
+    augmented = augmented or {}
+    similarities = []
+    for song_name, stored_files in all_fingerprints.items():
+        song_variants = augmented.get(song_name, {})
+        for file_type, stored_fingerprint in stored_files.items():
+            variants = song_variants.get(file_type, {})
+
+            # Remove '.wav' from file_type if desired
+            file_type = file_type.replace(".wav", "")
+
+            # Compute similarity
+            similarity = compute_similarity(fingerprint, stored_fingerprint)
+            for variant in variants.values():
+                similarity = max(similarity, compute_similarity(fingerprint, variant["fingerprint"]))
+
+            # Append the results as a tuple
+            similarities.append((song_name, similarity, file_type))
+
+            if early_exit is not None and similarity >= early_exit:
+                similarities.sort(key=lambda x: x[1], reverse=True)
+                return similarities
+
+    # Sort similarities in descending order during computation
+    similarities.sort(key=lambda x: x[1], reverse=True)
+    return similarities
+
+
+def _binomial_tail(positions, matches, probability):
+    """P(X >= matches) for X ~ Binomial(positions, probability)."""
+    return sum(
+        math.comb(positions, i) * probability ** i * (1 - probability) ** (positions - i)
+        for i in range(max(0, matches), positions + 1)
+    )
+
+
+def similarity_for_confidence(confidence, positions, chance, comparisons):
+    """
+    Smallest similarity whose match_confidence under the `chance` background reaches
+    `confidence` across `comparisons` catalog entries, or None if no similarity does.
+    """
+    tail = 0.0
+    threshold = None
+    for matches in range(positions, -1, -1):
+        tail += math.comb(positions, matches) * chance ** matches * (1 - chance) ** (positions - matches)
+        if (1 - min(tail, 1.0)) ** comparisons < confidence:
+            break
+        threshold = matches / positions
+    return threshold
+
+
+def match_confidence(similarities, positions, chance, catalog_size=None, competitor_scores=None):
+    """
+    Calibrated confidence that the best similarity is a real match rather than the best of
+    `catalog_size` unrelated hashes.
+    Other stems of the top song are not competitors: the margin is measured against the best
+    entry of a different song, and the background per-position match rate is the mean of the
+    different-song scores (or `chance` when there are too few). The confidence is the
+    probability that no unrelated entry would reach the top score under that binomial background.
+    :param positions: Compared units per hash (hex characters or bits).
+    :param competitor_scores: Different-song scores computed with the same metric as the top
+                              score; taken from `similarities` when not given.
+    :return: Dict with top similarity, margin to the best other song, background rate and confidence.
+    """
+    if not similarities:
+        return {"similarity": 0.0, "margin": 0.0, "background": chance, "confidence": 0.0}
+
+    top_song, top = similarities[0][0], similarities[0][1]
+    if competitor_scores is None:
+        competitor_scores = [similarity for song_name, similarity, _ in similarities if song_name != top_song]
+    margin = top - max(competitor_scores) if competitor_scores else top
+    if len(competitor_scores) >= MIN_BACKGROUND_SCORES:
+        background = sum(competitor_scores) / len(competitor_scores)
+    else:
+        background = chance
+    background = min(max(background, 1e-6), 1 - 1e-6)
+
+    tail = _binomial_tail(positions, round(top * positions), background)
+    comparisons = catalog_size or len(similarities)
+    confidence = (1 - min(tail, 1.0)) ** comparisons
+    return {"similarity": top, "margin": margin, "background": background, "confidence": confidence}
+
+
+def _encode_hashes(hashes, pad_value):
+    """
+    Encode hash strings as a (len(hashes), max_length) uint8 array of character codes.
+    Short rows are padded with `pad_value`; returns the array and the true lengths.
+    """
+    lengths = np.array([len(h) for h in hashes], dtype=np.int64)
+    width = int(lengths.max()) if len(hashes) else 0
+    encoded = np.full((len(hashes), width), pad_value, dtype=np.uint8)
+    for row, h in enumerate(hashes):
+        encoded[row, :len(h)] = np.frombuffer(h.encode("ascii"), dtype=np.uint8)
+    return encoded, lengths
+
+
+def _pad_columns(encoded, width, pad_value):
+    if encoded.shape[1] == width:
+        return encoded
+    padded = np.full((encoded.shape[0], width), pad_value, dtype=np.uint8)
+    padded[:, :encoded.shape[1]] = encoded
+    return padded
+
+
+def score_batch(query_fingerprints, all_fingerprints, top_k=10, memory_budget=MATCH_MEMORY_BUDGET):
+    """
+    Score Q query fingerprints against the whole catalog as blocked Q x N matrix operations.
+    Uses the same character-match metric as compute_similarity.
+    Each query block keeps a running top_k that is merged with one catalog block at a time, so
+    the temporaries stay within `memory_budget` for any catalog size as long as the top_k state
+    itself fits (a full ranking, top_k=None, is as large as its result).
+    :return: One list per query of (song_name, similarity, file_type) tuples, top_k highest first.
+    """
+    entries = [
+        (song_name, file_type.replace(".wav", ""), stored_fingerprint)
+        for song_name, stored_files in all_fingerprints.items()
+        for file_type, stored_fingerprint in stored_files.items()
+    ]
+    if not query_fingerprints:
+        return []
+    if not entries:
+        return [[] for _ in query_fingerprints]
+
+    # Different pad values on each side so padding never counts as a match
+    catalog, catalog_lengths = _encode_hashes([entry[2] for entry in entries], pad_value=255)
+    queries, query_lengths = _encode_hashes(list(query_fingerprints), pad_value=254)
+    width = max(catalog.shape[1], queries.shape[1])
+    catalog = _pad_columns(catalog, width, 255)
+    queries = _pad_columns(queries, width, 254)
+
+    num_queries, num_entries = len(queries), len(entries)
+    top_k = num_entries if top_k is None else min(top_k, num_entries)
+
+    if top_k <= 0:
+        return [[] for _ in query_fingerprints]
+
+    # Half of the budget for one query's comparison block (one boolean per character plus
+    # the int64 match count and float32 score per pair), the rest for the query block's merge
+    # of its running top-k with that block (float32 score + int64 index per slot, ~3 copies)
+    catalog_block = max(1, min(num_entries, memory_budget // 2 // (width + 12)))
+    per_query = catalog_block * (width + 12) + (top_k + catalog_block) * 36
+    query_block = max(1, min(num_queries, memory_budget // per_query))
+
+    results = []
+    for q_start in range(0, num_queries, query_block):
+        q_stop = min(num_queries, q_start + query_block)
+        query_rows = queries[q_start:q_stop]
+        best_scores = np.empty((q_stop - q_start, 0), dtype=np.float32)
+        best_indices = np.empty((q_stop - q_start, 0), dtype=np.int64)
+
+        for n_start in range(0, num_entries, catalog_block):
+            n_stop = min(num_entries, n_start + catalog_block)
+            matches = (query_rows[:, None, :] == catalog[None, n_start:n_stop, :]).sum(axis=2)
+            denominators = np.maximum(query_lengths[q_start:q_stop, None], catalog_lengths[None, n_start:n_stop])
+            block_scores = (matches / denominators).astype(np.float32)
+            block_indices = np.broadcast_to(np.arange(n_start, n_stop), block_scores.shape)
+
+            # Keep the top_k of (running top-k + block): highest similarity first, catalog order
+            # on ties (like the sequential scan)
+            merged_scores = np.concatenate((best_scores, block_scores), axis=1)
+            merged_indices = np.concatenate((best_indices, block_indices), axis=1)
+            order = np.lexsort((merged_indices, -merged_scores), axis=-1)[:, :top_k]
+            best_scores = np.take_along_axis(merged_scores, order, axis=1)
+            best_indices = np.take_along_axis(merged_indices, order, axis=1)
+
+        for row_scores, row_indices in zip(best_scores, best_indices):
+            results.append([
+                (entries[i][0], float(score), entries[i][1]) for score, i in zip(row_scores, row_indices)
+            ])
+
+    return results
+
+
+def _entry_signatures(song_name, file_type, all_signatures, augmented):
+    """Clean and distorted signatures of one catalog entry."""
+    stored = all_signatures.get(song_name, {}).get(file_type)
+    return ([stored] if stored else []) + list(augmented.get(song_name, {}).get(file_type, {}).values())
+
+
+def score_coarse(signatures, all_fingerprints, all_signatures, augmented=None, stems=None):
+    """
+    Coarse pass of the cascade: the best 16-bit coarse similarity of every entry that has signatures
+    (only entries of `stems`, e.g. {"vocals"}, when given).
+    :return: (coarse_similarity, song_name, file_type) tuples in catalog order.
+    """
+    augmented = augmented or {}
+    scores = []
+    for song_name, stored_files in all_fingerprints.items():
+        for file_type in stored_files:
+            if stems is not None and os.path.splitext(file_type)[0] not in stems:
+                continue
+            candidates = _entry_signatures(song_name, file_type, all_signatures, augmented)
+            if candidates:
+                coarse = max(hamming_similarity(signatures["coarse"], c["coarse"]) for c in candidates)
+                scores.append((coarse, song_name, file_type))
+    return scores
+
+
+def select_survivors(coarse_scores, keep_ratio=COARSE_KEEP_RATIO, min_candidates=COARSE_MIN_CANDIDATES):
+    """
+    (song_name, file_type) of the entries kept by the coarse pass, best coarse score first
+    (ties by name, so the selection does not depend on the order the scores were gathered in).
+    """
+    keep = max(min_candidates, int(len(coarse_scores) * keep_ratio))
+    ranked = sorted(coarse_scores, key=lambda x: (-x[0], x[1], x[2]))
+    return [(song_name, file_type) for _, song_name, file_type in ranked[:keep]]
+
+
+def score_fine(signatures, survivors, all_signatures, augmented=None, early_exit=None):
+    """
+    Fine re-rank of the coarse survivors in the given order with the 256-bit signature.
+    With `early_exit`, stops after the first entry whose fine similarity reaches it.
+    :return: (song_name, similarity, file_type) tuples of the entries scored.
+    """
+    augmented = augmented or {}
+    scored = []
+    for song_name, file_type in survivors:
+        candidates = _entry_signatures(song_name, file_type, all_signatures, augmented)
+        similarity = max(hamming_similarity(signatures["fine"], c["fine"]) for c in candidates)
+        scored.append((song_name, similarity, file_type))
+        if early_exit is not None and similarity >= early_exit:
+            break
+    return scored
+
+
+def score_phash(fingerprint, all_fingerprints, augmented=None, skip=()):
+    """
+    Bitwise similarity of the 64-bit pHash (best over the distorted variants) of every entry
+    whose (song_name, file_type) is not in `skip`.
+    :return: (song_name, similarity, file_type) tuples in catalog order.
+    """
+    augmented = augmented or {}
+    scored = []
+    for song_name, stored_files in all_fingerprints.items():
+        song_variants = augmented.get(song_name, {})
+        for file_type, stored_fingerprint in stored_files.items():
+            if (song_name, file_type) in skip:
+                continue
+            similarity = hamming_similarity(fingerprint, stored_fingerprint)
+            for variant in song_variants.get(file_type, {}).values():
+                similarity = max(similarity, hamming_similarity(fingerprint, variant["fingerprint"]))
+            scored.append((song_name, similarity, file_type))
+    return scored
+
+
+def merge_cascade(fine_scores, phash_scores):
+    """
+    Combine the fine and pHash passes into one ranking, refined entries first and ties by name.
+    :return: (similarities, refined) as returned by score_cascade.
+    """
+    refined = {(song_name, file_type.replace(".wav", "")) for song_name, _, file_type in fine_scores}
+    similarities = [
+        (song_name, similarity, file_type.replace(".wav", ""))
+        for song_name, similarity, file_type in fine_scores + phash_scores
+    ]
+    similarities.sort(key=lambda x: ((x[0], x[2]) not in refined, -x[1], x[0], x[2]))
+    return similarities, refined
+
+
+def score_cascade(fingerprint, signatures, all_fingerprints, all_signatures, augmented=None, stems=None,
+                  early_exit=None, keep_ratio=COARSE_KEEP_RATIO, min_candidates=COARSE_MIN_CANDIDATES):
+    """
+    Coarse-to-fine matching: rank every entry by its cheap coarse signature,
+    keep the best candidates and re-rank only those with the 256-bit fine signature.
+    Every score is a bitwise similarity (share of agreeing hash bits, ~BIT_CHANCE for
+    unrelated audio): refined entries use the fine signature, pruned entries and entries
+    without stored signatures keep the bitwise similarity of their 64-bit pHash, so the
+    ranking covers the whole catalog on one scale. The 64-bit scores vary more between
+    unrelated songs, so refined entries are listed first and pruned ones after them.
+    With `augmented` ({song_name: {file_type: {variant: {"fingerprint", "coarse", "fine"}}}}),
+    every score of an entry is the best over its clean hashes and its distorted variants.
+    With `stems` (e.g. {"vocals"}), only entries of those stems enter the coarse and fine passes.
+    With `early_exit`, the fine re-rank (in coarse order) stops at the first entry whose fine
+    similarity reaches it, and the pHash pass is skipped: only the entries refined so far are
+    returned. The 16-bit coarse pass is then the only pass over the whole catalog.
+    :return: (similarities, refined) with (song_name, similarity, file_type) tuples and the
+             set of (song_name, file_type) scored with the fine signature.
+    """
+    survivors = select_survivors(
+        score_coarse(signatures, all_fingerprints, all_signatures, augmented, stems), keep_ratio, min_candidates
+    )
+    fine_scores = score_fine(signatures, survivors, all_signatures, augmented, early_exit)
+    if early_exit is not None and fine_scores and fine_scores[-1][1] >= early_exit:
+        return merge_cascade(fine_scores, [])
+
+    skip = {(song_name, file_type) for song_name, _, file_type in fine_scores}
+    return merge_cascade(fine_scores, score_phash(fingerprint, all_fingerprints, augmented, skip))
 
 
 class SongMatcher:
-    def __init__(self, file_path, fingerprints):
+    @profiled("song_matcher")
+    def __init__(self, file_path, fingerprints, signatures=None, augmented=None, router=None, scheduler=None,
+                 shards=None, early_exit_confidence=EARLY_EXIT_CONFIDENCE, min_confidence=MIN_MATCH_CONFIDENCE,
+                 min_margin=MIN_MATCH_MARGIN):
+        """
+        :param fingerprints: {song_name: {file_type: pHash}} catalog.
+        :param signatures: Optional {song_name: {file_type: {"coarse", "fine"}}} catalog;
+                           when given, matching runs the coarse-to-fine cascade.
+        :param augmented: Optional {song_name: {file_type: {variant: {"fingerprint", "coarse", "fine"}}}}
+                          distorted variants; each entry scores its best clean or variant hash.
+        :param router: Optional StemRouter calibrated on the same catalog; when given, the cascade
+                       first refines only the query's most likely stem.
+        :param scheduler: ResourceScheduler admitting the query decode (default: the shared one).
+        :param shards: Optional ShardedCatalog holding the same catalog; the cascade then runs
+                       in its shard workers instead of over the in-process dicts.
+        :param early_exit_confidence: Stop scoring at the first entry whose similarity reaches this
+                                      confidence under the chance background (None scores everything).
+        :param min_confidence: Confidence needed for get_match_result to report a match.
+        :param min_margin: Margin over the best different song needed to report a match.
+        """
         self.feature_extractor = FeatureExtractor()
+        self.all_fingerprints = fingerprints
+        self.all_signatures = signatures
+        self.all_augmented = augmented
+        self.router = router
+        self.shards = shards
+        self.scheduler = scheduler or get_scheduler()
+        self.early_exit_confidence = early_exit_confidence
+        self.min_confidence = min_confidence
+        self.min_margin = min_margin
+        self.exited_early = False
+        self.refined = None  # Entries scored with the fine signature (cascade only)
+        self.signatures = None
+        self.routed_stem = None
+        self.scanned_all_stems = True
+        self.spectrogram, self.sr = None, None
         self.fingerprint = self.__generate_fingerprint(file_path)
         self.similarities = []  # Initialize as an empty list
-        self.all_fingerprints = fingerprints
         self.__compute_all_similarities()  # Compute similarities during initialization
 
     def __generate_fingerprint(self, file_path):
-        """Generate a fingerprint for the provided audio file."""
+        """Generate a fingerprint (and cascade signatures if needed) for the provided audio file."""
         # Generate spectrogram
-        spectrogram, sr = self.feature_extractor.generate_mel_spectrogram(file_path)
+        # Queries are admitted ahead of any background ingestion
+        spectrogram, sr = self.scheduler.run(
+            QUERY, estimate_decode_bytes(file_path),
+            self.feature_extractor.generate_mel_spectrogram, file_path
+        )
         if spectrogram is None or sr is None:
             raise ValueError(f"Failed to generate spectrogram for file: {file_path}")
+        self.spectrogram, self.sr = spectrogram, sr
+
+        # Render once, hash at both resolutions
+        try:
+            image = self.feature_extractor.render_spectrogram_image(spectrogram)
+        except Exception as e:
+            raise ValueError(f"Failed to render spectrogram for file: {file_path}") from e
 
         # Generate perceptual hash fingerprint
-        fingerprint = self.feature_extractor.generate_perceptual_hash(spectrogram)
+        fingerprint = self.feature_extractor.generate_perceptual_hash(spectrogram, image=image)
         if not fingerprint:
             raise ValueError(f"Failed to generate fingerprint for file: {file_path}")
 
-        return fingerprint
+        if self.all_signatures:
+            self.signatures = self.feature_extractor.generate_signatures(spectrogram, image=image, sr=sr)
 
-    def __compute_similarity(self, fingerprint1, fingerprint2):
-        """Compute a similarity metric between two perceptual hashes."""
-        # Use Hamming distance for perceptual hashes
-        return sum(c1 == c2 for c1, c2 in zip(fingerprint1, fingerprint2)) / max(len(fingerprint1), len(fingerprint2))
+        return fingerprint
 
     def __compute_all_similarities(self):
         """Compute similarity for the fingerprint against all songs and store results."""
-        for song_name, stored_files in self.all_fingerprints.items():
-            for file_type, stored_fingerprint in stored_files.items():
-                # Remove '.wav' from file_type if desired
-                file_type = file_type.replace(".wav", "")
+        catalog_size = sum(len(stored_files) for stored_files in self.all_fingerprints.values())
+        if self.signatures:
+            positions, chance = len(self.signatures["fine"]) * 4, BIT_CHANCE
+        else:
+            positions, chance = len(self.fingerprint), CHARACTER_CHANCE
+        early_exit = None
+        if self.early_exit_confidence is not None and catalog_size:
+            early_exit = similarity_for_confidence(self.early_exit_confidence, positions, chance, catalog_size)
 
-                # Compute similarity
-                similarity = self.__compute_similarity(self.fingerprint, stored_fingerprint)
+        if self.signatures:
+            if self.router is not None:
+                self.routed_stem = self.router.route(self.signatures.get("vocal_ratio"))
+            if self.routed_stem is not None:
+                # Refine the routed stem only; stop there if its best match is convincing
+                self.similarities, self.refined = self.__score_cascade(early_exit, stems={self.routed_stem})
+                if self.refined and self.similarities[0][1] >= self.router.min_similarity:
+                    self.scanned_all_stems = False
+                else:
+                    self.similarities, self.refined = self.__score_cascade(early_exit)
+            else:
+                self.similarities, self.refined = self.__score_cascade(early_exit)
+        else:
+            self.similarities = score_fingerprints(
+                self.fingerprint, self.all_fingerprints, self.all_augmented, early_exit=early_exit
+            )
+        self.exited_early = bool(early_exit is not None and self.similarities and self.similarities[0][1] >= early_exit)
 
-                # Append the results as a tuple
-                self.similarities.append((song_name, similarity, file_type))
+    def __score_cascade(self, early_exit, stems=None):
+        if self.shards is not None:
+            return self.shards.score_cascade(
+                self.fingerprint, self.signatures, stems=stems, early_exit=early_exit
+            )
+        return score_cascade(
+            self.fingerprint, self.signatures, self.all_fingerprints, self.all_signatures,
+            augmented=self.all_augmented, stems=stems, early_exit=early_exit
+        )
 
-        # Sort similarities in descending order during computation
-        self.similarities.sort(key=lambda x: x[1], reverse=True)
+    @staticmethod
+    def match_batch(query_fingerprints, all_fingerprints, top_k=10, memory_budget=MATCH_MEMORY_BUDGET):
+        """
+        Match many query fingerprints at once (see score_batch).
+        :return: One top_k list of (song_name, similarity, file_type) per query.
+        """
+        return score_batch(query_fingerprints, all_fingerprints, top_k=top_k, memory_budget=memory_budget)
 
     def compute_all_similarities(self):
         """Return all precomputed similarities."""
@@ -56,3 +462,43 @@ class SongMatcher:
         # The best match is the first item in the sorted list
         best_match, best_similarity, best_file_type = self.similarities[0]
         return best_match
+
+    def get_match_result(self):
+        """
+        Best match with its calibrated confidence.
+        :return: Dict with song_name, file_type, similarity, margin, confidence, exited_early and
+                 is_match; is_match is False (an explicit "no match") when the confidence or the
+                 margin is below the configured thresholds.
+        """
+        top_song, _, top_type = self.similarities[0] if self.similarities else (None, 0.0, None)
+        competitor_scores = None
+        if self.refined is not None:
+            # Background and margin only from different-song entries scored like the top one
+            top_refined = (top_song, top_type) in self.refined
+            competitor_scores = [
+                similarity for song_name, similarity, file_type in self.similarities
+                if song_name != top_song and ((song_name, file_type) in self.refined) == top_refined
+            ]
+            if top_refined:
+                positions, chance = len(self.signatures["fine"]) * 4, BIT_CHANCE
+            else:
+                # Nothing was refined; the top entry kept its bitwise pHash score
+                positions, chance = len(self.fingerprint) * 4, BIT_CHANCE
+        else:
+            positions, chance = len(self.fingerprint), CHARACTER_CHANCE
+        catalog_size = sum(len(stored_files) for stored_files in self.all_fingerprints.values())
+
+        result = match_confidence(
+            self.similarities, positions, chance, catalog_size=catalog_size, competitor_scores=competitor_scores
+        )
+        result.update({
+            "song_name": top_song,
+            "file_type": top_type,
+            "exited_early": self.exited_early,
+            "is_match": bool(
+                self.similarities
+                and result["confidence"] >= self.min_confidence
+                and result["margin"] >= self.min_margin
+            ),
+        })
+        return result
@@ -0,0 +1,153 @@
+import random
+import time
+from itertools import combinations
+
+from app.models.fingerprint_matcher import hamming_similarity
+
+
+def _bitwise_similarity(fingerprint1, fingerprint2):
+    """hamming_similarity, the metric the buckets approximate; hashes of different sizes never match."""
+    if len(fingerprint1) != len(fingerprint2):
+        return 0.0
+    return hamming_similarity(fingerprint1, fingerprint2)
+
+
+class FingerprintLSHIndex:
+    """
+    Approximate nearest-neighbour index over perceptual-hash fingerprints.
+    Each of `num_tables` tables keys entries by a random sample of `bits_per_table`
+    bits of the hash, so fingerprints that differ in few bits tend to share a bucket.
+    A query probes its own bucket plus every bucket within `probe_depth` flipped
+    key bits, then ranks only those candidates with the exact bitwise similarity
+    (hamming_similarity, as SongMatcher scores the pHash).
+
+    Tuning: more tables or a deeper probe raise recall and latency; more bits per
+    table make buckets smaller, lowering latency and recall.
+    """
+
+    def __init__(self, all_fingerprints, num_tables=8, bits_per_table=16, probe_depth=1, seed=0):
+        self.num_tables = num_tables
+        self.bits_per_table = bits_per_table
+        self.probe_depth = probe_depth
+
+        self.entries = [
+            (song_name, file_type.replace(".wav", ""), stored_fingerprint)
+            for song_name, stored_files in all_fingerprints.items()
+            for file_type, stored_fingerprint in stored_files.items()
+        ]
+        self.hash_bits = len(self.entries[0][2]) * 4 if self.entries else 0
+
+        rng = random.Random(seed)
+        bits = min(bits_per_table, self.hash_bits)
+        self.bit_samples = [rng.sample(range(self.hash_bits), bits) for _ in range(num_tables)]
+
+        self.tables = [{} for _ in range(num_tables)]
+        self.unindexed = []  # Entries whose hash length differs; always scored exactly
+        for index, (_, _, stored_fingerprint) in enumerate(self.entries):
+            if len(stored_fingerprint) * 4 != self.hash_bits:
+                self.unindexed.append(index)
+                continue
+            value = int(stored_fingerprint, 16)
+            for table, positions in zip(self.tables, self.bit_samples):
+                table.setdefault(self._key(value, positions), []).append(index)
+
+    @staticmethod
+    def _key(value, positions):
+        key = 0
+        for position in positions:
+            key = (key << 1) | ((value >> position) & 1)
+        return key
+
+    def _probe_keys(self, key, width):
+        """The key itself and every key within probe_depth flipped bits."""
+        yield key
+        for depth in range(1, self.probe_depth + 1):
+            for flipped in combinations(range(width), depth):
+                probe = key
+                for bit in flipped:
+                    probe ^= 1 << bit
+                yield probe
+
+    def candidates(self, fingerprint):
+        """Indices of the entries sharing a probed bucket with the fingerprint."""
+        found = set(self.unindexed)
+        if len(fingerprint) * 4 != self.hash_bits:
+            # Cannot be bucketed; fall back to every entry
+            return set(range(len(self.entries)))
+
+        value = int(fingerprint, 16)
+        for table, positions in zip(self.tables, self.bit_samples):
+            for probe in self._probe_keys(self._key(value, positions), len(positions)):
+                found.update(table.get(probe, ()))
+        return found
+
+    def query(self, fingerprint, top_k=10):
+        """
+        :return: Up to top_k (song_name, similarity, file_type) tuples, highest first.
+        """
+        similarities = []
+        for index in self.candidates(fingerprint):
+            song_name, file_type, stored_fingerprint = self.entries[index]
+            similarities.append((song_name, _bitwise_similarity(fingerprint, stored_fingerprint), file_type))
+
+        similarities.sort(key=lambda x: x[1], reverse=True)
+        return similarities[:top_k]
+
+
+def evaluate_recall(all_fingerprints, holdout_fraction=0.1, top_k=10, seed=0, **index_options):
+    """
+    Measure recall@top_k and latency of the LSH index against the exact bitwise pHash ranking
+    (hamming_similarity over every indexed entry, as SongMatcher scores the pHash).
+    A random held-out share of the catalog entries is used as queries; the rest is indexed.
+    The similarity takes few distinct values, so an approximate result counts as a hit
+    when its exact score ties or beats the k-th exact score, whichever tied entry was picked.
+    :param index_options: Passed to FingerprintLSHIndex (num_tables, bits_per_table, probe_depth, seed).
+    :return: Dict with mean recall, mean candidates per query and mean exact/approximate latency in ms.
+    """
+    entries = [
+        (song_name, file_type, stored_fingerprint)
+        for song_name, stored_files in all_fingerprints.items()
+        for file_type, stored_fingerprint in stored_files.items()
+    ]
+    if len(entries) < 2:
+        raise ValueError("Recall needs at least two catalog entries: one to query and one to index")
+    rng = random.Random(seed)
+    rng.shuffle(entries)
+    holdout_count = max(1, int(len(entries) * holdout_fraction))
+    queries, indexed = entries[:holdout_count], entries[holdout_count:]
+
+    catalog = {}
+    for song_name, file_type, stored_fingerprint in indexed:
+        catalog.setdefault(song_name, {})[file_type] = stored_fingerprint
+    index = FingerprintLSHIndex(catalog, **index_options)
+
+    recalls, candidate_counts, exact_times, approx_times = [], [], [], []
+    for _, _, fingerprint in queries:
+        start = time.perf_counter()
+        exact = sorted(
+            ((song_name, _bitwise_similarity(fingerprint, stored_fingerprint), file_type)
+             for song_name, file_type, stored_fingerprint in index.entries),
+            key=lambda x: x[1], reverse=True
+        )
+        exact_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        approx = index.query(fingerprint, top_k=top_k)
+        approx_times.append(time.perf_counter() - start)
+
+        candidate_counts.append(len(index.candidates(fingerprint)))
+        expected = min(top_k, len(exact))
+        kth_score = exact[expected - 1][1]
+        exact_scores = {(song_name, file_type): similarity for song_name, similarity, file_type in exact}
+        hits = sum(exact_scores[(song_name, file_type)] >= kth_score for song_name, _, file_type in approx)
+        recalls.append(hits / expected)
+
+    count = len(queries)
+    return {
+        "queries": count,
+        "recall": sum(recalls) / count,
+        "mean_candidates": sum(candidate_counts) / count,
+        "catalog_size": len(indexed),
+        "exact_latency_ms": 1000 * sum(exact_times) / count,
+        "approx_latency_ms": 1000 * sum(approx_times) / count,
+    }
@@ -0,0 +1,51 @@
+from functools import cached_property
+
+
+class SpectrogramAnalysis:
+    """
+    Bundle of representations derived from one log-scaled Mel spectrogram.
+    Each representation is computed on first access and cached, so ingestion
+    steps that need the same data (features, hashes, plots) share a single copy.
+    """
+
+    def __init__(self, spectrogram, sr, feature_extractor):
+        self.spectrogram = spectrogram
+        self.sr = sr
+        self.feature_extractor = feature_extractor
+
+    @cached_property
+    def amplitude(self):
+        """Amplitude spectrogram used by the spectral and tonal features."""
+        import librosa
+        return librosa.db_to_amplitude(self.spectrogram)
+
+    @cached_property
+    def chroma(self):
+        import librosa
+        return librosa.feature.chroma_stft(S=self.amplitude, sr=self.sr)
+
+    @cached_property
+    def mfcc(self):
+        import librosa
+        return librosa.feature.mfcc(S=self.spectrogram, sr=self.sr, n_mfcc=13)
+
+    @cached_property
+    def image(self):
+        """Rendered spectrogram image shared by the pHash fingerprint and the fine signature."""
+        return self.feature_extractor.render_spectrogram_image(self.spectrogram)
+
+    def render(self):
+        """Render the hash image now (cached), so a rendering failure surfaces before any hashing."""
+        return self.image
+
+    @cached_property
+    def features(self):
+        return self.feature_extractor.extract_features(self.spectrogram, self.sr, analysis=self)
+
+    @cached_property
+    def fingerprint(self):
+        return self.feature_extractor.generate_perceptual_hash(self.spectrogram, image=self.image)
+
+    @cached_property
+    def signatures(self):
+        return self.feature_extractor.generate_signatures(self.spectrogram, image=self.image, sr=self.sr)
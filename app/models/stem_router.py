@@ -0,0 +1,77 @@
+import os
+import numpy as np
+
+
+class StemRouter:
+    """
+    Routes a query to the stem (vocals, song or instruments) it most likely matches,
+    using the share of mel energy in the vocal band as a cheap pre-classifier.
+    SongMatcher then re-ranks only that stem's cascade candidates with the fine signature;
+    the other stems are refined as well only when the classification or the routed
+    match is not confident enough.
+    """
+
+    def __init__(self, vocal_threshold=0.6, instrument_threshold=0.35, min_confidence=0.5, min_similarity=0.75):
+        """
+        :param vocal_threshold: Vocal-band energy ratio above which a query is routed to vocals.
+        :param instrument_threshold: Ratio below which a query is routed to instruments.
+        :param min_confidence: Classifier confidence needed to route at all.
+        :param min_similarity: Best routed similarity needed to skip refining the other stems.
+        """
+        self.vocal_threshold = vocal_threshold
+        self.instrument_threshold = instrument_threshold
+        self.min_confidence = min_confidence
+        self.min_similarity = min_similarity
+
+    @classmethod
+    def from_catalog(cls, all_signatures, **options):
+        """
+        Build a router calibrated on the vocal ratios stored with the catalog signatures.
+        :param all_signatures: {song_name: {file_type: {"coarse", "fine", "vocal_ratio"}}} catalog.
+        """
+        router = cls(**options)
+        router.calibrate(
+            (os.path.splitext(file_type)[0], signatures["vocal_ratio"])
+            for stored_files in all_signatures.values()
+            for file_type, signatures in stored_files.items()
+            if "vocal_ratio" in signatures
+        )
+        return router
+
+    def classify(self, ratio):
+        """
+        :param ratio: Vocal-band energy ratio of the query (FeatureExtractor.vocal_energy_ratio).
+        :return: (stem, confidence) with confidence in [0, 1], growing with the distance
+                 of the ratio from the nearest decision threshold.
+        """
+        margin = (self.vocal_threshold - self.instrument_threshold) / 2
+        if ratio >= self.vocal_threshold:
+            stem, distance = "vocals", ratio - self.vocal_threshold
+        elif ratio <= self.instrument_threshold:
+            stem, distance = "instruments", self.instrument_threshold - ratio
+        else:
+            stem = "song"
+            distance = min(ratio - self.instrument_threshold, self.vocal_threshold - ratio)
+        return stem, min(1.0, distance / margin) if margin > 0 else 0.0
+
+    def route(self, ratio):
+        """The stem to refine first, or None when the query cannot be classified confidently."""
+        if ratio is None:
+            return None
+        stem, confidence = self.classify(ratio)
+        return stem if confidence >= self.min_confidence else None
+
+    def calibrate(self, labelled_ratios):
+        """
+        Set the thresholds halfway between the median ratios of each stem.
+        :param labelled_ratios: Iterable of (stem, vocal_energy_ratio) from known catalog files.
+        """
+        by_stem = {}
+        for stem, ratio in labelled_ratios:
+            by_stem.setdefault(stem, []).append(ratio)
+        medians = {stem: float(np.median(ratios)) for stem, ratios in by_stem.items()}
+
+        if "vocals" in medians and "song" in medians:
+            self.vocal_threshold = (medians["vocals"] + medians["song"]) / 2
+        if "instruments" in medians and "song" in medians:
+            self.instrument_threshold = (medians["instruments"] + medians["song"]) / 2
@@ -0,0 +1,161 @@
+import argparse
+import csv
+import json
+import time
+import numpy as np
+
+from app.models.feature_extractor import FeatureExtractor
+from app.models.fingerprint_matcher import score_cascade
+from app.utils.dtype_policy import AUDIO_DTYPE
+
+# Seconds fingerprinted per file, as in FeatureExtractor.generate_mel_spectrogram
+FINGERPRINT_DURATION = 30
+# Extra audio loaded so a sped-up variant still covers the full window
+LOAD_MARGIN = 1.1
+
+
+def _add_noise(y, sr, rng, snr_db=20):
+    noise_power = np.mean(y ** 2) / (10 ** (snr_db / 10))
+    return y + rng.normal(0, np.sqrt(noise_power), y.shape).astype(y.dtype)
+
+
+def _apply_gain(y, sr, rng, gain_db=6):
+    return np.clip(y * (10 ** (gain_db / 20)), -1.0, 1.0)
+
+
+def _filter(y, sr, btype, cutoff):
+    from scipy.signal import butter, sosfilt
+    sos = butter(4, cutoff, btype=btype, fs=sr, output="sos")
+    return sosfilt(sos, y).astype(y.dtype)
+
+
+def _time_stretch(y, sr, rate):
+    import librosa
+    return librosa.effects.time_stretch(y, rate=rate)
+
+
+# Variant name -> function(signal, sample_rate, rng) returning the distorted signal
+VARIANTS = {
+    "noise_20db": _add_noise,
+    "gain_plus_6db": _apply_gain,
+    "eq_lowpass_4khz": lambda y, sr, rng: _filter(y, sr, "lowpass", 4000),
+    "eq_highpass_200hz": lambda y, sr, rng: _filter(y, sr, "highpass", 200),
+    "tempo_plus_5": lambda y, sr, rng: _time_stretch(y, sr, 1.05),
+    "tempo_minus_5": lambda y, sr, rng: _time_stretch(y, sr, 0.95),
+}
+
+
+def fingerprint_variants(file_path, variant_names, seed=0):
+    """
+    Load a file once and return {variant_name: {"fingerprint", "coarse", "fine"}} for the
+    requested variants, so a variant can match through the cascade like its parent track.
+    Runs in a worker process during augmentation.
+    """
+    extractor = FeatureExtractor()
+    rng = np.random.default_rng(seed)
+    y, sr = extractor.load_audio(file_path, duration=FINGERPRINT_DURATION * LOAD_MARGIN, dtype=AUDIO_DTYPE)
+
+    entries = {}
+    for variant_name in variant_names:
+        try:
+            variant = VARIANTS[variant_name](y, sr, rng)[:int(FINGERPRINT_DURATION * sr)]
+            spectrogram = extractor.mel_spectrogram_from_signal(variant, sr)
+            image = extractor.render_spectrogram_image(spectrogram)
+            fingerprint = extractor.generate_perceptual_hash(spectrogram, image=image)
+            signatures = extractor.generate_signatures(spectrogram, image=image)
+        except Exception as e:
+            print(f"[Error] Skipping {variant_name} variant of {file_path}: {e}")
+            continue
+        if fingerprint and signatures:
+            entries[variant_name] = {"fingerprint": fingerprint, **signatures}
+    return entries
+
+
+def entry_size(variant_name, entry):
+    """Approximate bytes one stored variant adds to the augmented JSON files."""
+    return len(json.dumps({variant_name: entry}, indent=4))
+
+
+def catalog_size(all_augmented):
+    return sum(
+        entry_size(variant_name, entry)
+        for stored_files in all_augmented.values()
+        for variants in stored_files.values()
+        for variant_name, entry in variants.items()
+    )
+
+
+def evaluate_augmentation(labelled_queries, all_fingerprints, all_signatures, all_augmented):
+    """
+    Compare top-1 hit rate, index size and cascade latency with and without the augmented
+    variants, scoring queries the same way SongMatcher does.
+    :param labelled_queries: Iterable of (file_path, expected_song_name), ideally real noisy recordings.
+    """
+    extractor = FeatureExtractor()
+    queries = []
+    for file_path, expected_song in labelled_queries:
+        spectrogram, _ = extractor.generate_mel_spectrogram(file_path)
+        if spectrogram is None:
+            continue
+        image = extractor.render_spectrogram_image(spectrogram)
+        fingerprint = extractor.generate_perceptual_hash(spectrogram, image=image)
+        signatures = extractor.generate_signatures(spectrogram, image=image)
+        if fingerprint and signatures:
+            queries.append((fingerprint, signatures, expected_song))
+    if not queries:
+        raise ValueError("No query could be fingerprinted.")
+
+    report = {"queries": len(queries)}
+    for label, augmented in (("clean", None), ("augmented", all_augmented)):
+        hits = 0
+        start = time.perf_counter()
+        for fingerprint, signatures, expected_song in queries:
+            ranking, _ = score_cascade(
+                fingerprint, signatures, all_fingerprints, all_signatures, augmented=augmented
+            )
+            hits += bool(ranking) and ranking[0][0] == expected_song
+        elapsed = time.perf_counter() - start
+
+        entries = sum(len(stored_files) for stored_files in all_fingerprints.values())
+        if augmented:
+            entries += sum(len(variants) for files in augmented.values() for variants in files.values())
+
+        report[label] = {
+            "hit_rate": hits / len(queries),
+            "index_entries": entries,
+            "mean_latency_ms": 1000 * elapsed / len(queries),
+        }
+
+    report["augmented_bytes"] = catalog_size(all_augmented)
+    report["hit_rate_gain"] = report["augmented"]["hit_rate"] - report["clean"]["hit_rate"]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate distorted catalog variants for robust matching.")
+    parser.add_argument("--base-path", default="static/songs", help="Song catalog folder")
+    parser.add_argument("--variants", nargs="+", choices=sorted(VARIANTS), help="Variants to generate (default: all)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per core)")
+    parser.add_argument("--budget-mb", type=float, default=5.0, help="Storage budget for the augmented files")
+    parser.add_argument("--evaluate", help="CSV of query_path,expected_song to compare hit rates afterwards")
+    args = parser.parse_args()
+
+    from app.services.files_setup import FeatureFoldersProcessor
+
+    service = FeatureFoldersProcessor(base_path=args.base_path)
+    added = service.augment_catalog(
+        variants=args.variants, workers=args.workers, storage_budget=int(args.budget_mb * 1024 * 1024)
+    )
+    print(f"Added {added} variants ({catalog_size(service.all_augmented) / 1024:.1f} KiB stored)")
+
+    if args.evaluate:
+        with open(args.evaluate, newline="") as csv_file:
+            labelled_queries = [(row[0], row[1]) for row in csv.reader(csv_file) if len(row) >= 2]
+        report = evaluate_augmentation(
+            labelled_queries, service.all_fingerprints, service.all_signatures, service.all_augmented
+        )
+        print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
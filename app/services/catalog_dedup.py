@@ -0,0 +1,87 @@
+import argparse
+import json
+
+from app.models.fingerprint_matcher import hamming_similarity
+from app.models.lsh_index import FingerprintLSHIndex
+
+
+def find_duplicate_clusters(all_fingerprints, max_bit_distance=4, include_same_song=False, **index_options):
+    """
+    Find groups of catalog entries whose fingerprints are identical or nearly so.
+    Instead of comparing all N^2 pairs, each entry is only compared with the entries
+    sharing an LSH bucket with it, and matching pairs are merged with union-find.
+    :param max_bit_distance: Largest pHash bit difference still treated as a duplicate.
+    :param include_same_song: Also pair different stems of the same song folder.
+    :param index_options: Passed to FingerprintLSHIndex (num_tables, bits_per_table, probe_depth, seed).
+    :return: Clusters as lists of (song_name, file_type), largest first.
+    """
+    index = FingerprintLSHIndex(all_fingerprints, **index_options)
+    entries = index.entries
+    parents = list(range(len(entries)))
+
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    for i, (song_name, _, fingerprint) in enumerate(entries):
+        for j in index.candidates(fingerprint):
+            if j <= i:
+                continue  # Every pair is checked once
+            other_song, _, other_fingerprint = entries[j]
+            if other_song == song_name and not include_same_song:
+                continue
+            if len(fingerprint) != len(other_fingerprint):
+                continue
+            bit_distance = round((1 - hamming_similarity(fingerprint, other_fingerprint)) * len(fingerprint) * 4)
+            if bit_distance <= max_bit_distance:
+                parents[find(j)] = find(i)
+
+    clusters = {}
+    for i, (song_name, file_type, _) in enumerate(entries):
+        clusters.setdefault(find(i), []).append((song_name, file_type))
+
+    duplicates = [sorted(cluster) for cluster in clusters.values() if len(cluster) > 1]
+    duplicates.sort(key=lambda cluster: (-len(cluster), cluster))
+    return duplicates
+
+
+def dedupe_fingerprints(all_fingerprints, clusters):
+    """
+    Return a copy of the catalog keeping only the first entry of every duplicate cluster.
+    """
+    removed = {entry for cluster in clusters for entry in cluster[1:]}
+    deduped = {}
+    for song_name, stored_files in all_fingerprints.items():
+        kept = {
+            file_type: fingerprint for file_type, fingerprint in stored_files.items()
+            if (song_name, file_type.replace(".wav", "")) not in removed
+        }
+        if kept:
+            deduped[song_name] = kept
+    return deduped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find duplicate and near-duplicate catalog entries.")
+    parser.add_argument("--base-path", default="static/songs", help="Song catalog folder")
+    parser.add_argument("--max-bit-distance", type=int, default=4, help="Largest pHash bit difference")
+    parser.add_argument("--output", help="Write the clusters as JSON to this file")
+    args = parser.parse_args()
+
+    from app.services.files_setup import FeatureFoldersProcessor
+
+    service = FeatureFoldersProcessor(base_path=args.base_path)
+    clusters = find_duplicate_clusters(service.all_fingerprints, max_bit_distance=args.max_bit_distance)
+
+    if args.output:
+        with open(args.output, "w") as json_file:
+            json.dump(clusters, json_file, indent=4)
+    for cluster in clusters:
+        print(", ".join(f"{song_name}/{file_type}" for song_name, file_type in cluster))
+    print(f"Found {len(clusters)} duplicate clusters covering {sum(len(c) for c in clusters)} entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import json
+
+
+class CatalogJournal:
+    """
+    Append-only write-ahead journal of processed catalog files, one JSON line per file.
+    Each entry is flushed and fsynced as soon as a file is processed, so a crash loses
+    at most the file being processed. Replaying the journal on the next run restores
+    every committed entry; the journal is cleared once the folder's JSON files are saved.
+    """
+
+    def __init__(self, journal_path):
+        self.journal_path = journal_path
+        os.makedirs(self.journal_path, exist_ok=True)
+
+    def _file_path(self, folder_name):
+        return os.path.join(self.journal_path, f"{folder_name}.jsonl")
+
+    def append(self, folder_name, entry):
+        """Durably commit one processed file's entry."""
+        line = (json.dumps(entry) + "\n").encode("utf-8")
+        with open(self._file_path(folder_name), "a+b") as journal_file:
+            # A crash can leave a torn last line; terminate it so this entry is not appended onto it
+            if journal_file.seek(0, os.SEEK_END):
+                journal_file.seek(-1, os.SEEK_END)
+                if journal_file.read(1) != b"\n":
+                    line = b"\n" + line
+            journal_file.write(line)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+
+    def replay(self, folder_name):
+        """Return the committed entries for a folder; a torn line from a crash is skipped."""
+        file_path = self._file_path(folder_name)
+        if not os.path.exists(file_path):
+            return []
+
+        entries = []
+        with open(file_path, "r") as journal_file:
+            for line in journal_file:
+                if not line.endswith("\n"):
+                    break  # Incomplete write
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    print(f"[Error] Skipping corrupt journal line in {file_path}")
+        return entries
+
+    def clear(self, folder_name):
+        """Drop the journal once its entries are part of the saved JSON files."""
+        file_path = self._file_path(folder_name)
+        if os.path.exists(file_path):
+            os.remove(file_path)
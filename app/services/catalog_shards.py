@@ -0,0 +1,192 @@
+import os
+import heapq
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from app.models.fingerprint_matcher import (
+    COARSE_KEEP_RATIO, COARSE_MIN_CANDIDATES, merge_cascade, score_coarse, score_fine, score_fingerprints,
+    score_phash, select_survivors
+)
+from app.utils.atomic_write import load_json
+
+# Catalog data owned by the current shard worker process
+_shard_fingerprints = {}
+_shard_signatures = {}
+_shard_augmented = {}
+
+
+def shard_for_folder(folder_name, num_shards):
+    """Stable shard index for a song folder (does not depend on Python's hash seed)."""
+    return zlib.crc32(folder_name.encode("utf-8")) % num_shards
+
+
+def _load_shard(catalog_root, folder_names):
+    """Worker initializer: load only this shard's fingerprints, signatures and variants into the worker."""
+    global _shard_fingerprints, _shard_signatures, _shard_augmented
+    _shard_fingerprints, _shard_signatures, _shard_augmented = {}, {}, {}
+    for folder_name in folder_names:
+        fingerprints = load_json(os.path.join(catalog_root, "fingerprints", f"{folder_name}.json"), default={})
+        if not fingerprints:
+            continue
+        _shard_fingerprints[folder_name] = fingerprints
+        _shard_signatures[folder_name] = load_json(
+            os.path.join(catalog_root, "signatures", f"{folder_name}.json"), default={}
+        )
+        augmented = load_json(os.path.join(catalog_root, "augmented", f"{folder_name}.json"), default={})
+        if augmented:
+            _shard_augmented[folder_name] = augmented
+
+
+def _query_shard(fingerprint, top_k):
+    """Score the query against this worker's shard and return its local top-k."""
+    similarities = score_fingerprints(fingerprint, _shard_fingerprints)
+    return similarities if top_k is None else similarities[:top_k]
+
+
+def _coarse_shard(signatures, stems):
+    """Coarse pass of the cascade over this worker's shard."""
+    return score_coarse(signatures, _shard_fingerprints, _shard_signatures, _shard_augmented, stems)
+
+
+def _fine_shard(signatures, survivors, early_exit):
+    """Fine re-rank of this shard's share of the global coarse survivors, in global coarse order."""
+    return score_fine(signatures, survivors, _shard_signatures, _shard_augmented, early_exit)
+
+
+def _phash_shard(fingerprint, skip):
+    """pHash pass over this worker's shard, skipping the refined entries."""
+    return score_phash(fingerprint, _shard_fingerprints, _shard_augmented, skip)
+
+
+class ShardedCatalog:
+    def __init__(self, fingerprints_path='static/fingerprints', num_shards=None):
+        """
+        Partition the saved catalog by song folder into `num_shards` shards, each loaded
+        (fingerprints, signatures and augmented variants) and scored inside its own worker process.
+        The parent process only keeps the folder names, never the catalog data.
+        """
+        self.fingerprints_path = fingerprints_path
+        self.catalog_root = os.path.dirname(fingerprints_path)
+        self.num_shards = num_shards or os.cpu_count() or 1
+        # Guards the executors against a reload while a query is being fanned out
+        self._lock = threading.Lock()
+        self.shards, self.workers = self._start()
+
+    def _partition_folders(self):
+        """Assign every fingerprint file in the catalog to a shard by folder name."""
+        shards = [[] for _ in range(self.num_shards)]
+        for file_name in sorted(os.listdir(self.fingerprints_path)):
+            # Hidden files are leftovers of interrupted atomic writes
+            if file_name.endswith(".json") and not file_name.startswith("."):
+                folder_name = os.path.splitext(file_name)[0]
+                shards[shard_for_folder(folder_name, self.num_shards)].append(folder_name)
+        return shards
+
+    def _start(self):
+        """:return: (shards, workers) with workers as (set of folder names, executor) pairs."""
+        shards = self._partition_folders()
+        workers = [
+            (set(folder_names), ProcessPoolExecutor(
+                max_workers=1,
+                initializer=_load_shard,
+                initargs=(self.catalog_root, folder_names)
+            ))
+            for folder_names in shards
+            if folder_names
+        ]
+        return shards, workers
+
+    def reload(self):
+        """
+        Re-partition and reload the shards from the saved catalog, e.g. after the catalog
+        snapshot was swapped. Queries already submitted finish on the old workers.
+        """
+        shards, workers = self._start()
+        with self._lock:
+            old_workers = self.workers
+            self.shards, self.workers = shards, workers
+        for _, executor in old_workers:
+            executor.shutdown(wait=True)
+
+    def _submit(self, function, *args):
+        with self._lock:
+            return [executor.submit(function, *args) for _, executor in self.workers]
+
+    def query(self, fingerprint, top_k=None):
+        """
+        Fan the query out to every shard and merge the per-shard results.
+        :param fingerprint: Perceptual hash string of the query.
+        :param top_k: Number of results to return, or None for the full ranking.
+        :return: (song_name, similarity, file_type) tuples, highest similarity first.
+        """
+        futures = self._submit(_query_shard, fingerprint, top_k)
+
+        merged = []
+        for future in futures:
+            merged.extend(future.result())
+
+        if top_k is None:
+            merged.sort(key=lambda x: x[1], reverse=True)
+            return merged
+        return heapq.nlargest(top_k, merged, key=lambda x: x[1])
+
+    def score_cascade(self, fingerprint, signatures, stems=None, early_exit=None,
+                      keep_ratio=COARSE_KEEP_RATIO, min_candidates=COARSE_MIN_CANDIDATES):
+        """
+        score_cascade over the whole sharded catalog, with the same result as in-process:
+        every shard runs the coarse pass, the survivors are selected globally, each shard
+        fine-scores its share of them (in global coarse order), and unless the early exit
+        was reached every shard scores its remaining entries with the pHash.
+        :return: (similarities, refined) as returned by score_cascade.
+        """
+        # Hold the lock across all passes so a reload cannot swap the workers in between
+        with self._lock:
+            return self._score_cascade(self.workers, fingerprint, signatures, stems, early_exit,
+                                       keep_ratio, min_candidates)
+
+    @staticmethod
+    def _score_cascade(workers, fingerprint, signatures, stems, early_exit, keep_ratio, min_candidates):
+        coarse_scores = []
+        for future in [executor.submit(_coarse_shard, signatures, stems) for _, executor in workers]:
+            coarse_scores.extend(future.result())
+        survivors = select_survivors(coarse_scores, keep_ratio, min_candidates)
+
+        futures = [
+            executor.submit(_fine_shard, signatures,
+                            [survivor for survivor in survivors if survivor[0] in folder_names], early_exit)
+            for folder_names, executor in workers
+        ]
+        shard_scores = {}
+        for future in futures:
+            shard_scores.update(
+                ((song_name, file_type), similarity) for song_name, similarity, file_type in future.result()
+            )
+
+        # Replay the fine re-rank in global coarse order; a shard only stops after an exit hit,
+        # so every survivor before the first global hit has been scored
+        fine_scores = []
+        for song_name, file_type in survivors:
+            similarity = shard_scores[(song_name, file_type)]
+            fine_scores.append((song_name, similarity, file_type))
+            if early_exit is not None and similarity >= early_exit:
+                return merge_cascade(fine_scores, [])
+
+        skip = {(song_name, file_type) for song_name, _, file_type in fine_scores}
+        phash_scores = []
+        for future in [executor.submit(_phash_shard, fingerprint, skip) for _, executor in workers]:
+            phash_scores.extend(future.result())
+        return merge_cascade(fine_scores, phash_scores)
+
+    def close(self):
+        """Shut down all shard worker processes."""
+        with self._lock:
+            workers, self.workers = self.workers, []
+        for _, executor in workers:
+            executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,189 @@
+import os
+import threading
+import time
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3')
+
+
+class CatalogWatcher:
+    """
+    Watches the song folders and hot-updates a FeatureFoldersProcessor without a restart.
+    Uses inotify through the optional `watchdog` package when it is installed and falls
+    back to polling file modification times otherwise. Bursts of changes (e.g. a copy of
+    several stems) are debounced into a single background refresh, after which the
+    processor swaps in a new catalog snapshot.
+    """
+
+    def __init__(self, processor, debounce=2.0, poll_interval=5.0, on_update=None):
+        """
+        :param debounce: Seconds without new changes before a refresh starts.
+        :param poll_interval: Seconds between scans when polling.
+        :param on_update: Optional callback receiving the new CatalogSnapshot (called from the worker thread).
+        """
+        self.processor = processor
+        self.base_path = processor.base_path
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.on_update = on_update
+
+        self._changed = set()
+        self._removed = set()
+        self._last_event = None
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self._observer = None
+
+    # ------------------------------------------------------------------------
+    #                           Lifecycle
+    # ------------------------------------------------------------------------
+    def start(self):
+        if not self._start_inotify():
+            self._threads.append(threading.Thread(target=self._poll_loop, name="catalog-poll", daemon=True))
+        self._threads.append(threading.Thread(target=self._refresh_loop, name="catalog-refresh", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    @property
+    def backend(self):
+        return "inotify" if self._observer is not None else "polling"
+
+    # ------------------------------------------------------------------------
+    #                           Change Sources
+    # ------------------------------------------------------------------------
+    def _start_inotify(self):
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return False
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    if event.event_type == "deleted":
+                        watcher._record_folder_removed(event.src_path)
+                    return
+                if event.event_type == "deleted":
+                    watcher._record(event.src_path, removed=True)
+                elif event.event_type == "moved":
+                    watcher._record(event.src_path, removed=True)
+                    watcher._record(event.dest_path)
+                elif event.event_type in ("created", "modified", "closed"):
+                    watcher._record(event.src_path)
+
+        self._observer = Observer()
+        self._observer.schedule(Handler(), self.base_path, recursive=True)
+        self._observer.start()
+        return True
+
+    def _scan(self):
+        """
+        {(folder_name, file_name): (mtime, size)} for every audio file under the base path.
+        Folders and files deleted while being scanned (e.g. during an `rm -r`) are left out.
+        """
+        state = {}
+        if not os.path.isdir(self.base_path):
+            return state
+        with os.scandir(self.base_path) as folders:
+            for folder in folders:
+                try:
+                    if not folder.is_dir():
+                        continue
+                    with os.scandir(folder.path) as entries:
+                        for entry in entries:
+                            try:
+                                if entry.is_file() and entry.name.endswith(AUDIO_EXTENSIONS):
+                                    stat = entry.stat()
+                                    state[(folder.name, entry.name)] = (stat.st_mtime_ns, stat.st_size)
+                            except OSError:
+                                continue
+                except OSError:
+                    continue
+        return state
+
+    def _poll_loop(self):
+        previous = None  # No successful scan yet
+        while True:
+            try:
+                current = self._scan()
+            except OSError as e:
+                # e.g. the base folder itself disappeared mid-scan; keep polling
+                print(f"[Error] Catalog scan failed: {e}")
+                current = None
+            if current is not None:
+                if previous is not None:
+                    changed = {key for key, value in current.items() if previous.get(key) != value}
+                    removed = set(previous) - set(current)
+                    if changed or removed:
+                        self._record_many(changed, removed)
+                previous = current
+            if self._stop.wait(self.poll_interval):
+                return
+
+    def _split(self, path):
+        """Map an absolute path to (folder_name, file_name), or None if it is not a catalog audio file."""
+        relative = os.path.relpath(path, self.base_path)
+        parts = relative.split(os.sep)
+        if len(parts) != 2 or not parts[1].endswith(AUDIO_EXTENSIONS):
+            return None
+        return parts[0], parts[1]
+
+    def _record(self, path, removed=False):
+        key = self._split(path)
+        if key is not None:
+            self._record_many(set() if removed else {key}, {key} if removed else set())
+
+    def _record_folder_removed(self, path):
+        relative = os.path.relpath(path, self.base_path)
+        if os.sep not in relative and relative != os.curdir:
+            # The folder's file names are not known any more; any one of them triggers its cleanup
+            self._record_many(set(), {(relative, "")})
+
+    def _record_many(self, changed, removed):
+        with self._condition:
+            self._changed |= changed
+            self._removed |= removed
+            self._last_event = time.monotonic()
+            self._condition.notify_all()
+
+    # ------------------------------------------------------------------------
+    #                           Background Refresh
+    # ------------------------------------------------------------------------
+    def _refresh_loop(self):
+        while not self._stop.is_set():
+            with self._condition:
+                while self._last_event is None and not self._stop.is_set():
+                    self._condition.wait()
+                # Debounce: wait until no new event arrived for `debounce` seconds
+                while not self._stop.is_set():
+                    remaining = self._last_event + self.debounce - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                if self._stop.is_set():
+                    return
+
+                changed, removed = self._changed, self._removed
+                self._changed, self._removed, self._last_event = set(), set(), None
+
+            try:
+                snapshot = self.processor.refresh(changed_files=changed - removed, removed_files=removed)
+            except Exception as e:
+                print(f"[Error] Catalog refresh failed: {e}")
+                continue
+            if self.on_update is not None:
+                self.on_update(snapshot)
@@ -1,103 +1,279 @@
 import os
-import json
-import matplotlib.pyplot as plt
-from app.models.feature_extractor import FeatureExtractor
+import shutil
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from app.models.feature_extractor import FeatureExtractor, extractor_version, has_matplotlib
+from app.services.catalog_journal import CatalogJournal
+from app.services.catalog_augmentation import (
+    FINGERPRINT_DURATION, LOAD_MARGIN, VARIANTS, fingerprint_variants, entry_size, catalog_size
+)
+from app.utils.atomic_write import atomic_write_json, load_json
+from app.utils.job_scheduler import INGEST, estimate_decode_bytes, get_scheduler
+from app.utils.profiling import profiled
+
+# Immutable view of the in-memory catalog; updates build a new snapshot and swap it in,
+# so a query holding a snapshot keeps seeing consistent data
+CatalogSnapshot = namedtuple("CatalogSnapshot", ["results", "fingerprints", "signatures", "augmented"])
+
+CATALOG_DATA_TYPES = ("features", "fingerprints", "signatures", "augmented")
+
+# Extractor version the saved catalog next to the songs folder was built with
+CATALOG_VERSION_FILE = "catalog_version.json"
+# Manifest of the last index bundle imported into the catalog
+INSTALLED_MANIFEST = "bundle_manifest.json"
+
+
+def read_catalog_version(base_path):
+    """Extractor version recorded for the saved catalog, or None if none was recorded."""
+    return load_json(os.path.join(os.path.dirname(base_path), CATALOG_VERSION_FILE), default={}).get(
+        "extractor_version"
+    )
+
+
+def write_catalog_version(base_path, version=None):
+    atomic_write_json(
+        os.path.join(os.path.dirname(base_path), CATALOG_VERSION_FILE),
+        {"extractor_version": version or extractor_version()}
+    )
+
+
+def has_catalog_data(base_path):
+    """True if any saved catalog data exists next to the songs folder."""
+    for data_type in CATALOG_DATA_TYPES:
+        directory = os.path.join(os.path.dirname(base_path), data_type)
+        if os.path.isdir(directory) and any(name.endswith(".json") for name in os.listdir(directory)):
+            return True
+    return False
 
 
 class FeatureFoldersProcessor:
-    def __init__(self, base_path='static/songs'):
+    def __init__(self, base_path='static/songs', scheduler=None):
         self.base_path = base_path
+        # Decodes are admitted by the scheduler shared with query code
+        self.scheduler = scheduler or get_scheduler()
         self.features_path = os.path.join(os.path.dirname(base_path), "features")
         self.fingerprints_path = os.path.join(os.path.dirname(base_path), "fingerprints")
         self.spectrograms_path = os.path.join(os.path.dirname(base_path), "spectrograms")
+        self.signatures_path = os.path.join(os.path.dirname(base_path), "signatures")
+        self.journal_path = os.path.join(os.path.dirname(base_path), "journal")
+        self.augmented_path = os.path.join(os.path.dirname(base_path), "augmented")
         self.feature_extractor = FeatureExtractor()
+        self.check_catalog_version()
         self.ensure_directories()
-        self.all_results, self.all_fingerprints = self.process_all_songs()
+        self.journal = CatalogJournal(self.journal_path)
+        # Serializes catalog updates (hot refresh, augmentation); readers never lock
+        self._update_lock = threading.Lock()
+        all_results, all_fingerprints, all_signatures = self.process_all_songs()
+        # Distorted variants are generated offline by augment_catalog(); load any that exist
+        self.snapshot = CatalogSnapshot(all_results, all_fingerprints, all_signatures, self.load_augmented())
+
+    @property
+    def all_results(self):
+        return self.snapshot.results
+
+    @property
+    def all_fingerprints(self):
+        return self.snapshot.fingerprints
+
+    @property
+    def all_signatures(self):
+        return self.snapshot.signatures
+
+    @property
+    def all_augmented(self):
+        return self.snapshot.augmented
 
     def ensure_directories(self):
-        """Ensure that the features, fingerprints, and spectrograms directories exist."""
+        """Ensure that the features, fingerprints, spectrograms, signatures, and augmented directories exist."""
         os.makedirs(self.features_path, exist_ok=True)
         os.makedirs(self.fingerprints_path, exist_ok=True)
         os.makedirs(self.spectrograms_path, exist_ok=True)
+        os.makedirs(self.signatures_path, exist_ok=True)
+        os.makedirs(self.augmented_path, exist_ok=True)
+
+    def check_catalog_version(self):
+        """
+        Saved features, fingerprints and signatures are only comparable with queries from the
+        same extractor version and renderer. A catalog built by another version (or before
+        versions were recorded) is moved aside to <catalog>/stale-v<version>-<time> and rebuilt
+        from the audio. If some catalog folders have no audio to rebuild from (e.g. they were
+        imported from an index bundle), the catalog is left in place and a ValueError is raised.
+        """
+        stored_version, current_version = read_catalog_version(self.base_path), extractor_version()
+        if stored_version != current_version and has_catalog_data(self.base_path):
+            without_audio = self.folders_without_audio()
+            if without_audio:
+                raise ValueError(
+                    f"Catalog was built with extractor version {stored_version}, this is {current_version}, "
+                    f"and {len(without_audio)} folder(s) have no audio to rebuild it from "
+                    f"(e.g. {without_audio[0]}). Run with the renderer the catalog was built with "
+                    f"(matplotlib installed or not), or move the saved catalog away and import an index "
+                    f"bundle built with {current_version}."
+                )
+            stale_path = os.path.join(
+                os.path.dirname(self.base_path),
+                f"stale-v{stored_version or 'unknown'}-{time.strftime('%Y%m%d-%H%M%S')}"
+            )
+            os.makedirs(stale_path)
+            for path in (self.features_path, self.fingerprints_path, self.signatures_path, self.augmented_path,
+                         self.journal_path, os.path.join(os.path.dirname(self.base_path), INSTALLED_MANIFEST)):
+                if os.path.exists(path):
+                    shutil.move(path, stale_path)
+            print(f"[Warning] Catalog was built with extractor version {stored_version}, this is "
+                  f"{current_version}; moved it to {stale_path} and rebuilding from the audio.")
+        if stored_version != current_version:
+            write_catalog_version(self.base_path, current_version)
+
+    def folders_without_audio(self):
+        """Names of folders with saved catalog data but no audio file under the base path."""
+        folders = set()
+        for directory in (self.features_path, self.fingerprints_path, self.signatures_path, self.augmented_path):
+            if os.path.isdir(directory):
+                folders.update(
+                    os.path.splitext(file_name)[0] for file_name in os.listdir(directory)
+                    if file_name.endswith(".json") and not file_name.startswith(".")
+                )
+        return sorted(
+            folder for folder in folders
+            if not os.path.isdir(os.path.join(self.base_path, folder))
+            or not any(name.endswith(('.wav', '.mp3')) for name in os.listdir(os.path.join(self.base_path, folder)))
+        )
 
     def get_song_folders(self):
-        """Retrieve all song folders in the base path."""
-        return [
-            os.path.join(self.base_path, folder)
-            for folder in os.listdir(self.base_path)
+        """
+        Retrieve all song folders in the base path, plus catalog entries that were
+        imported from an index bundle without their audio.
+        """
+        folders = [
+            folder for folder in os.listdir(self.base_path)
             if os.path.isdir(os.path.join(self.base_path, folder))
-        ]
+        ] if os.path.isdir(self.base_path) else []
+
+        for file_name in sorted(os.listdir(self.fingerprints_path)):
+            folder = os.path.splitext(file_name)[0]
+            if file_name.endswith(".json") and not file_name.startswith(".") and folder not in folders:
+                folders.append(folder)
+
+        return [os.path.join(self.base_path, folder) for folder in folders]
 
     def save_to_json(self, folder_name, data, data_type):
-        """Save data to a JSON file in the appropriate directory."""
+        """Atomically save data to a JSON file in the appropriate directory."""
         if data_type == "features":
             file_path = os.path.join(self.features_path, f"{folder_name}.json")
         elif data_type == "fingerprints":
             file_path = os.path.join(self.fingerprints_path, f"{folder_name}.json")
+        elif data_type == "signatures":
+            file_path = os.path.join(self.signatures_path, f"{folder_name}.json")
+        elif data_type == "augmented":
+            file_path = os.path.join(self.augmented_path, f"{folder_name}.json")
         else:
             raise ValueError("Invalid data type specified")
 
-        with open(file_path, "w") as json_file:
-            json.dump(data, json_file, indent=4)
+        atomic_write_json(file_path, data)
 
     def save_spectrogram(self, folder_name, file_name, spectrogram):
         """Save spectrogram data to the spectrograms directory as a PNG image."""
+        # The PNGs are only for inspection; query-only installs may not ship matplotlib
+        if not has_matplotlib():
+            return
+
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
         folder_path = os.path.join(self.spectrograms_path, folder_name)
         os.makedirs(folder_path, exist_ok=True)
         spectrogram_file = os.path.join(folder_path, f"{file_name}.png")
 
-        # Plot the spectrogram
-        plt.figure(figsize=(10, 4))
-        plt.imshow(spectrogram, aspect='auto', origin='lower', interpolation='none')
-        plt.colorbar(format='%+2.0f dB')
-        plt.title(f"Spectrogram - {file_name}")
-        plt.xlabel('Time')
-        plt.ylabel('Frequency')
-        plt.tight_layout()
+        # Plot the spectrogram on a bare Agg figure (no pyplot state or GUI figure manager)
+        fig = Figure(figsize=(10, 4))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        image = ax.imshow(spectrogram, aspect='auto', origin='lower', interpolation='none')
+        fig.colorbar(image, ax=ax, format='%+2.0f dB')
+        ax.set_title(f"Spectrogram - {file_name}")
+        ax.set_xlabel('Time')
+        ax.set_ylabel('Frequency')
+        fig.tight_layout()
 
         # Save the plot as a PNG file
-        plt.savefig(spectrogram_file, dpi=300)
-        plt.close()  # Close the plot to free up memory
+        fig.savefig(spectrogram_file, dpi=300)
 
     def process_song_folder(self, folder_path):
         folder_name = os.path.basename(folder_path)
-        results = {}
-        fingerprints = {}
-
         features_file = os.path.join(self.features_path, f"{folder_name}.json")
         fingerprints_file = os.path.join(self.fingerprints_path, f"{folder_name}.json")
+        signatures_file = os.path.join(self.signatures_path, f"{folder_name}.json")
 
-        if os.path.exists(features_file):
-            with open(features_file, "r") as f:
-                results = json.load(f)
+        # Unreadable files (e.g. truncated by a crash) are treated as empty and rebuilt
+        results = load_json(features_file, default={})
+        fingerprints = load_json(fingerprints_file, default={})
+        signatures = load_json(signatures_file, default={})
 
-        if os.path.exists(fingerprints_file):
-            with open(fingerprints_file, "r") as f:
-                fingerprints = json.load(f)
+        # Resume from entries committed before an interrupted run
+        for entry in self.journal.replay(folder_name):
+            file_name = entry["file"]
+            if "features" in entry:
+                results[file_name] = entry["features"]
+            if "fingerprint" in entry:
+                fingerprints[file_name] = entry["fingerprint"]
+            if "signatures" in entry:
+                signatures[file_name] = entry["signatures"]
 
-        for file_name in os.listdir(folder_path):
+        audio_files = os.listdir(folder_path) if os.path.isdir(folder_path) else []
+        for file_name in audio_files:
             file_path = os.path.join(folder_path, file_name)
-            if os.path.isfile(file_path) \
-                    and file_name.endswith(('.wav', '.mp3')) \
-                    and file_name not in results \
-                    and file_name not in fingerprints:
+            if not os.path.isfile(file_path) or not file_name.endswith(('.wav', '.mp3')):
+                continue
+
+            needs_fingerprint = file_name not in results and file_name not in fingerprints
+            # Older catalogs only hold the pHash; backfill the cascade signatures and the
+            # vocal-band ratio the stem router calibrates on
+            needs_signatures = "vocal_ratio" not in signatures.get(file_name, {})
 
-                spectrogram, sr = self.feature_extractor.generate_mel_spectrogram(file_path)
+            if needs_fingerprint or needs_signatures:
+                spectrogram, sr = self.scheduler.run(
+                    INGEST, estimate_decode_bytes(file_path),
+                    self.feature_extractor.generate_mel_spectrogram, file_path
+                )
                 if spectrogram is None or sr is None:
                     print(f"[Error] Skipping {file_path} due to failed spectrogram generation.")
                     continue
 
+                # Every derived representation below is computed once and shared
+                analysis = self.feature_extractor.analyze(spectrogram, sr)
+                try:
+                    analysis.render()
+                except Exception as e:
+                    print(f"[Error] Skipping {file_path} due to failed spectrogram rendering: {e}")
+                    continue
+
+                # Generate coarse and fine signatures
+                entry = {"file": file_name}
+                file_signatures = analysis.signatures
+                if file_signatures:
+                    signatures[file_name] = file_signatures
+                    entry["signatures"] = file_signatures
+                else:
+                    print(f"[Error] Failed to generate signatures for {file_path}.")
+
+                if not needs_fingerprint:
+                    if file_signatures:
+                        self.journal.append(folder_name, entry)
+                    continue
+
                 # Save spectrogram data
                 self.save_spectrogram(folder_name, file_name, spectrogram)
 
                 # Extract features
-                features = self.feature_extractor.extract_features(spectrogram, sr)
+                features = analysis.features
                 if not features:
                     print(f"[Error] Skipping {file_path} due to empty features.")
                     continue
 
                 # Generate fingerprint
-                fingerprint = self.feature_extractor.generate_perceptual_hash(spectrogram)
+                fingerprint = analysis.fingerprint
                 if not fingerprint:
                     print(f"[Error] Skipping {file_path} due to failed fingerprint generation.")
                     continue
@@ -105,17 +281,169 @@ class FeatureFoldersProcessor:
                 results[file_name] = features
                 fingerprints[file_name] = fingerprint
 
+                # Commit this file immediately
+                entry["features"] = features
+                entry["fingerprint"] = fingerprint
+                self.journal.append(folder_name, entry)
+
         self.save_to_json(folder_name, results, "features")
         self.save_to_json(folder_name, fingerprints, "fingerprints")
-        return results, fingerprints
+        self.save_to_json(folder_name, signatures, "signatures")
+        self.journal.clear(folder_name)
+        return results, fingerprints, signatures
 
+    @profiled("process_all_songs")
     def process_all_songs(self):
         """Process all song folders and generate a comprehensive result."""
         all_results = {}
         all_fingerprints = {}
+        all_signatures = {}
         for folder_path in self.get_song_folders():
             folder_name = os.path.basename(folder_path)
-            results, fingerprints = self.process_song_folder(folder_path)
+            results, fingerprints, signatures = self.process_song_folder(folder_path)
             all_results[folder_name] = results
             all_fingerprints[folder_name] = fingerprints
-        return all_results, all_fingerprints
+            all_signatures[folder_name] = signatures
+        return all_results, all_fingerprints, all_signatures
+
+    def load_augmented(self):
+        """Load the stored distorted-variant hashes of every song folder."""
+        all_augmented = {}
+        for folder_path in self.get_song_folders():
+            folder_name = os.path.basename(folder_path)
+            augmented = load_json(os.path.join(self.augmented_path, f"{folder_name}.json"), default={})
+            if augmented:
+                all_augmented[folder_name] = augmented
+        return all_augmented
+
+    def augment_catalog(self, variants=None, workers=None, storage_budget=5 * 1024 * 1024):
+        """
+        Fingerprint distorted variants (noise, gain, EQ, tempo) of every catalog file in
+        parallel and store their pHash and cascade signatures under the parent track in
+        the augmented directory.
+        Variants that already exist are skipped; scheduling stops once the augmented
+        files would exceed `storage_budget` bytes.
+        :param variants: Names from catalog_augmentation.VARIANTS (default: all).
+        :return: Number of variants added.
+        """
+        variants = list(variants or VARIANTS)
+        unknown = [name for name in variants if name not in VARIANTS]
+        if unknown:
+            raise ValueError(f"Unknown augmentation variants: {unknown}")
+
+        # Plan the work within the storage budget (estimated from the hash length)
+        used = catalog_size(self.all_augmented)
+        estimated_entry = {
+            name: entry_size(name, {"fingerprint": "0" * 16, "coarse": "0" * 4, "fine": "0" * 64})
+            for name in variants
+        }
+        jobs = []
+        budget_reached = False
+        for song_name, stored_files in self.all_fingerprints.items():
+            for file_name in stored_files:
+                existing = self.all_augmented.get(song_name, {}).get(file_name, {})
+                missing = []
+                for name in variants:
+                    if name in existing:
+                        continue
+                    if used + estimated_entry[name] > storage_budget:
+                        budget_reached = True
+                        break
+                    used += estimated_entry[name]
+                    missing.append(name)
+                if missing:
+                    file_path = os.path.join(self.base_path, song_name, file_name)
+                    jobs.append((song_name, file_name, file_path, missing))
+
+        if budget_reached:
+            print("[Warning] Augmentation storage budget reached; some variants were not scheduled.")
+
+        completed = []
+        max_in_flight = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Each decode is admitted by the shared scheduler as background work, so augmentation
+            # yields to queries and never holds more decoded audio than the memory budget allows
+            admitted = self.scheduler.map_admitted(executor, INGEST, [
+                (estimate_decode_bytes(file_path, duration=FINGERPRINT_DURATION * LOAD_MARGIN),
+                 fingerprint_variants, (file_path, missing))
+                for _, _, file_path, missing in jobs
+            ], max_in_flight)
+            for index, future in admitted:
+                song_name, file_name = jobs[index][:2]
+                try:
+                    entries = future.result()
+                except Exception as e:
+                    print(f"[Error] Augmentation failed for {song_name}/{file_name}: {e}")
+                    continue
+                if entries:
+                    completed.append((song_name, file_name, entries))
+
+        added = 0
+        with self._update_lock:
+            # Copy on write so queries holding the current snapshot are unaffected
+            augmented = {
+                song_name: {file_name: dict(variants) for file_name, variants in stored_files.items()}
+                for song_name, stored_files in self.all_augmented.items()
+            }
+            for song_name, file_name, entries in completed:
+                augmented.setdefault(song_name, {}).setdefault(file_name, {}).update(entries)
+                added += len(entries)
+
+            for folder_name in {song_name for song_name, _, _ in completed}:
+                self.save_to_json(folder_name, augmented[folder_name], "augmented")
+            self.snapshot = self.snapshot._replace(augmented=augmented)
+        return added
+
+    def refresh(self, changed_files=(), removed_files=()):
+        """
+        Re-ingest added/modified audio and drop removed audio, then atomically swap in a new snapshot.
+        :param changed_files: Iterable of (folder_name, file_name) that were added or modified.
+        :param removed_files: Iterable of (folder_name, file_name) that were deleted.
+        """
+        stale = set(changed_files) | set(removed_files)
+        if not stale:
+            return self.snapshot
+
+        with self._update_lock:
+            snapshot = self.snapshot
+            results, fingerprints = dict(snapshot.results), dict(snapshot.fingerprints)
+            signatures, augmented = dict(snapshot.signatures), dict(snapshot.augmented)
+
+            for folder_name in sorted({folder_name for folder_name, _ in stale}):
+                stale_files = {file_name for folder, file_name in stale if folder == folder_name}
+                folder_path = os.path.join(self.base_path, folder_name)
+
+                if not os.path.isdir(folder_path):
+                    # The whole song folder is gone
+                    for data_type in CATALOG_DATA_TYPES:
+                        catalog_file = os.path.join(os.path.dirname(self.base_path), data_type, f"{folder_name}.json")
+                        if os.path.exists(catalog_file):
+                            os.remove(catalog_file)
+                    for catalog in (results, fingerprints, signatures, augmented):
+                        catalog.pop(folder_name, None)
+                    continue
+
+                # Forget the saved data of stale files so process_song_folder recomputes them
+                for data_type in CATALOG_DATA_TYPES:
+                    catalog_file = os.path.join(os.path.dirname(self.base_path), data_type, f"{folder_name}.json")
+                    data = load_json(catalog_file, default={})
+                    if any(file_name in data for file_name in stale_files):
+                        self.save_to_json(
+                            folder_name,
+                            {key: value for key, value in data.items() if key not in stale_files},
+                            data_type
+                        )
+
+                results[folder_name], fingerprints[folder_name], signatures[folder_name] = \
+                    self.process_song_folder(folder_path)
+                folder_augmented = {
+                    file_name: variants for file_name, variants in augmented.get(folder_name, {}).items()
+                    if file_name not in stale_files
+                }
+                if folder_augmented:
+                    augmented[folder_name] = folder_augmented
+                else:
+                    augmented.pop(folder_name, None)
+
+            self.snapshot = CatalogSnapshot(results, fingerprints, signatures, augmented)
+            return self.snapshot
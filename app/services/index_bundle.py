@@ -0,0 +1,248 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+import zipfile
+
+from app.models.feature_extractor import extractor_version
+from app.services.files_setup import (
+    INSTALLED_MANIFEST, has_catalog_data, read_catalog_version, write_catalog_version
+)
+from app.utils.atomic_write import atomic_write_json, load_json
+
+# 2: bundle_id covers the whole manifest, not only the members
+BUNDLE_FORMAT_VERSION = 2
+
+# Catalog directories shipped in a bundle, next to the songs folder
+DATA_TYPES = ("features", "fingerprints", "signatures", "augmented")
+
+MANIFEST_NAME = "manifest.json"
+
+
+def _catalog_root(base_path):
+    return os.path.dirname(base_path)
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _serialize(data):
+    """Canonical JSON bytes, so equal content always has the same checksum."""
+    return json.dumps(data, indent=4, sort_keys=True).encode("utf-8")
+
+
+def _catalog_folders(base_path):
+    """Folder names that have any saved catalog data."""
+    folders = set()
+    for data_type in DATA_TYPES:
+        directory = os.path.join(_catalog_root(base_path), data_type)
+        if os.path.isdir(directory):
+            folders.update(
+                os.path.splitext(file_name)[0] for file_name in os.listdir(directory)
+                if file_name.endswith(".json") and not file_name.startswith(".")
+            )
+    return sorted(folders)
+
+
+def _load_folder(base_path, folder_name):
+    """Return {data_type: data} for the saved catalog data of one folder."""
+    folder_data = {}
+    for data_type in DATA_TYPES:
+        data = load_json(os.path.join(_catalog_root(base_path), data_type, f"{folder_name}.json"))
+        if data:
+            folder_data[data_type] = data
+    return folder_data
+
+
+def _folder_checksum(folder_data):
+    return _sha256(_serialize(folder_data))
+
+
+def _bundle_id(manifest):
+    """Checksum of everything import acts on: versions, kind, base, folders and member checksums."""
+    return _sha256(_serialize({
+        key: manifest.get(key)
+        for key in ("format_version", "extractor_version", "kind", "base", "folders", "members")
+    }))
+
+
+def _check_folder_name(folder_name):
+    """Reject folder names that could address files outside the catalog directories."""
+    if (not isinstance(folder_name, str) or not folder_name or folder_name.startswith(".")
+            or "/" in folder_name or "\\" in folder_name or "\0" in folder_name):
+        raise ValueError(f"Invalid folder name in bundle: {folder_name!r}")
+    return folder_name
+
+
+def read_manifest(bundle_path):
+    """Read the manifest of a bundle (.zip) or a stand-alone manifest (.json)."""
+    if bundle_path.endswith(".json"):
+        return load_json(bundle_path)
+    with zipfile.ZipFile(bundle_path) as bundle:
+        return json.loads(bundle.read(MANIFEST_NAME))
+
+
+def export_bundle(output_path, base_path="static/songs", base_manifest=None):
+    """
+    Write the saved catalog (features, fingerprints, signatures, augmented variants) to a
+    versioned, checksummed zip bundle. No audio is read.
+    :param base_manifest: Manifest of a bundle the target already has; when given, only folders
+                          whose content changed since then are exported (a delta bundle).
+    :return: The bundle manifest.
+    """
+    catalog_version, current_version = read_catalog_version(base_path), extractor_version()
+    if catalog_version != current_version:
+        raise ValueError(
+            f"Catalog was built with extractor version {catalog_version}, this is {current_version}; "
+            f"start the app once to rebuild it before exporting"
+        )
+
+    base_folders = (base_manifest or {}).get("folders", {})
+    manifest = {
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "extractor_version": current_version,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "kind": "delta" if base_manifest else "full",
+        "base": base_manifest.get("bundle_id") if base_manifest else None,
+        "folders": {},
+        "members": {},
+    }
+
+    with zipfile.ZipFile(output_path, "w", compression=zipfile.ZIP_DEFLATED) as bundle:
+        for folder_name in _catalog_folders(base_path):
+            folder_data = _load_folder(base_path, folder_name)
+            checksum = _folder_checksum(folder_data)
+            if base_folders.get(folder_name, {}).get("checksum") == checksum:
+                continue
+
+            manifest["folders"][folder_name] = {
+                "checksum": checksum,
+                "files": sorted(folder_data.get("fingerprints", {})),
+            }
+            for data_type, data in folder_data.items():
+                member = f"{data_type}/{folder_name}.json"
+                payload = _serialize(data)
+                bundle.writestr(member, payload)
+                manifest["members"][member] = _sha256(payload)
+
+        manifest["bundle_id"] = _bundle_id(manifest)
+        bundle.writestr(MANIFEST_NAME, _serialize(manifest))
+
+    return manifest
+
+
+def import_bundle(bundle_path, base_path="static/songs"):
+    """
+    Verify a bundle and load it into the catalog next to `base_path`.
+    Full bundles replace all data (every data type) of the folders they contain; delta bundles
+    are merged entry by entry into the existing data. All files are written atomically.
+    :return: The bundle manifest.
+    """
+    with zipfile.ZipFile(bundle_path) as bundle:
+        manifest = json.loads(bundle.read(MANIFEST_NAME))
+
+        if manifest.get("format_version") != BUNDLE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported bundle format version: {manifest.get('format_version')}")
+        current_version = extractor_version()
+        if manifest.get("extractor_version") != current_version:
+            raise ValueError(
+                f"Bundle was built with extractor version {manifest.get('extractor_version')}, "
+                f"this catalog uses {current_version}"
+            )
+        catalog_version = read_catalog_version(base_path)
+        if catalog_version != current_version and has_catalog_data(base_path):
+            raise ValueError(
+                f"Local catalog was built with extractor version {catalog_version}; "
+                f"start the app once to rebuild it before importing"
+            )
+
+        # Verify everything before writing anything
+        if manifest.get("kind") not in ("full", "delta"):
+            raise ValueError(f"Unknown bundle kind: {manifest.get('kind')}")
+        if manifest.get("bundle_id") != _bundle_id(manifest):
+            raise ValueError(f"Manifest checksum mismatch in {bundle_path}")
+        for folder_name in manifest["folders"]:
+            _check_folder_name(folder_name)
+
+        payloads = {}
+        for member, checksum in manifest["members"].items():
+            data_type, _, file_name = member.partition("/")
+            folder_name, extension = os.path.splitext(file_name)
+            if (data_type not in DATA_TYPES or extension != ".json"
+                    or _check_folder_name(folder_name) not in manifest["folders"]):
+                raise ValueError(f"Unexpected bundle member: {member}")
+            payload = bundle.read(member)
+            if _sha256(payload) != checksum:
+                raise ValueError(f"Checksum mismatch for {member} in {bundle_path}")
+            payloads[member] = json.loads(payload)
+
+    if manifest["kind"] == "delta":
+        installed = load_json(os.path.join(_catalog_root(base_path), INSTALLED_MANIFEST), default={})
+        if installed.get("bundle_id") != manifest.get("base"):
+            print(f"[Warning] Delta bundle was built against {manifest.get('base')}, "
+                  f"catalog has {installed.get('bundle_id')}; merging entries anyway.")
+
+    for member, data in payloads.items():
+        data_type, file_name = member.split("/", 1)
+        directory = os.path.join(_catalog_root(base_path), data_type)
+        os.makedirs(directory, exist_ok=True)
+        file_path = os.path.join(directory, file_name)
+        if manifest["kind"] == "delta":
+            data = {**load_json(file_path, default={}), **data}
+        atomic_write_json(file_path, data)
+
+    if manifest["kind"] == "full":
+        # Drop data types the bundle does not ship, so no stale signatures or variants are left behind
+        for folder_name in manifest["folders"]:
+            for data_type in DATA_TYPES:
+                file_path = os.path.join(_catalog_root(base_path), data_type, f"{folder_name}.json")
+                if f"{data_type}/{folder_name}.json" not in payloads and os.path.exists(file_path):
+                    os.remove(file_path)
+    write_catalog_version(base_path, current_version)
+
+    all_folders = {}
+    for folder_name in _catalog_folders(base_path):
+        folder_data = _load_folder(base_path, folder_name)
+        all_folders[folder_name] = {
+            "checksum": _folder_checksum(folder_data),
+            "files": sorted(folder_data.get("fingerprints", {})),
+        }
+    _save_installed_manifest(base_path, manifest, all_folders)
+    return manifest
+
+
+def _save_installed_manifest(base_path, manifest, all_folders):
+    installed = {key: value for key, value in manifest.items() if key != "members"}
+    installed["folders"] = all_folders
+    atomic_write_json(os.path.join(_catalog_root(base_path), INSTALLED_MANIFEST), installed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import precomputed catalog index bundles.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Write the saved catalog to a bundle")
+    export_parser.add_argument("output", help="Bundle file to write (.zip)")
+    export_parser.add_argument("--base", help="The target's bundle_manifest.json (or a full bundle it has); exports a delta")
+    export_parser.add_argument("--base-path", default="static/songs", help="Song catalog folder")
+
+    import_parser = subparsers.add_parser("import", help="Load a bundle into the catalog")
+    import_parser.add_argument("bundle", help="Bundle file to load (.zip)")
+    import_parser.add_argument("--base-path", default="static/songs", help="Song catalog folder")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        base_manifest = read_manifest(args.base) if args.base else None
+        manifest = export_bundle(args.output, base_path=args.base_path, base_manifest=base_manifest)
+        print(f"Exported {manifest['kind']} bundle {manifest['bundle_id'][:12]} "
+              f"with {len(manifest['folders'])} folders to {args.output}")
+    else:
+        manifest = import_bundle(args.bundle, base_path=args.base_path)
+        print(f"Imported {manifest['kind']} bundle {manifest['bundle_id'][:12]} "
+              f"with {len(manifest['folders'])} folders")
+
+
+if __name__ == "__main__":
+    main()
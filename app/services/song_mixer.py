@@ -1,7 +1,10 @@
 import numpy as np
 import soundfile as sf
 import os
-from scipy.signal import resample
+
+from app.utils.dtype_policy import AUDIO_DTYPE, as_audio_dtype
+from app.utils.wav_reader import open_mapped_wav
+from app.utils.profiling import profiled
 
 
 class SongMixer:
@@ -13,9 +16,8 @@ class SongMixer:
         self.filepath01 = filepath01
         self.filepath02 = filepath02
 
-        # Read the audio files
-        self.audio01, self.samplerate01 = sf.read(filepath01)
-        self.audio02, self.samplerate02 = sf.read(filepath02)
+        # Read only the overlapping duration of both files, directly as float32
+        self.audio01, self.samplerate01, self.audio02, self.samplerate02 = self._read_overlap()
 
         # Resample if sample rates do not match
         target_samplerate = min(self.samplerate01, self.samplerate02)
@@ -29,12 +31,48 @@ class SongMixer:
         # Trim to the shorter length
         self._trim_to_match_length()
 
+    def _open_audio(self, filepath):
+        """
+        Return (mapped_wav, samplerate, frames) without decoding any audio.
+        mapped_wav is None for files that cannot be memory-mapped.
+        """
+        wav = open_mapped_wav(filepath)
+        if wav is not None:
+            return wav, wav.samplerate, wav.frames
+        info = sf.info(filepath)
+        return None, info.samplerate, info.frames
+
+    def _read_overlap(self):
+        """
+        Read the first N seconds of both files, where N is the shorter duration.
+        Memory-mapped WAVs only convert those frames; other formats decode just that many frames.
+        """
+        wav01, samplerate01, frames01 = self._open_audio(self.filepath01)
+        wav02, samplerate02, frames02 = self._open_audio(self.filepath02)
+        duration = min(frames01 / samplerate01, frames02 / samplerate02)
+
+        audio = []
+        for filepath, wav, samplerate in ((self.filepath01, wav01, samplerate01),
+                                          (self.filepath02, wav02, samplerate02)):
+            frames = int(duration * samplerate)
+            if wav is not None:
+                audio.append(wav.read(0, frames))
+            else:
+                audio.append(sf.read(filepath, frames=frames, dtype=AUDIO_DTYPE)[0])
+
+        return audio[0], samplerate01, audio[1], samplerate02
+
     def _resample_audio(self, audio, original_rate, target_rate):
         """
         Resamples audio to the target sample rate.
         """
+        if original_rate == target_rate:
+            return audio
         num_samples = int(len(audio) * target_rate / original_rate)
-        return resample(audio, num_samples)
+        from scipy.signal import resample
+
+        # scipy computes in float64; bring the result back to the audio dtype
+        return as_audio_dtype(resample(audio, num_samples))
 
     def _normalize_audio(self, audio):
         """
@@ -74,6 +112,7 @@ class SongMixer:
 
         return mixed_audio
 
+    @profiled("save_mixed_audio")
     def save_mixed_audio(self, weight, output_filename='mixed song.wav'):
         """
         Save the mixed audio to a file.
@@ -0,0 +1,133 @@
+import argparse
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from app.models.feature_extractor import FeatureExtractor
+from app.models.fingerprint_matcher import score_cascade, score_fingerprints
+from app.services.song_mixer import SongMixer
+from app.utils.job_scheduler import DECODE_OVERHEAD, INGEST, get_scheduler
+
+# Mixer shared by the sweep worker processes
+_worker_mixer = None
+
+
+def _init_worker(mixer):
+    global _worker_mixer
+    _worker_mixer = mixer
+
+
+def _fingerprint_blend(weight):
+    """Mix one blend in memory and return its perceptual hash and cascade signatures."""
+    extractor = FeatureExtractor()
+    mixed_audio = _worker_mixer.mix(weight)
+    spectrogram = extractor.mel_spectrogram_from_signal(mixed_audio, _worker_mixer.samplerate)
+    # Render once, hash at both resolutions, as SongMatcher does
+    image = extractor.render_spectrogram_image(spectrogram)
+    fingerprint = extractor.generate_perceptual_hash(spectrogram, image=image)
+    signatures = extractor.generate_signatures(spectrogram, image=image, sr=_worker_mixer.samplerate)
+    return fingerprint, signatures
+
+
+def sweep_weights(filepath01, filepath02, all_fingerprints, all_signatures=None, all_augmented=None,
+                  step=1, workers=None, duration=30, scheduler=None):
+    """
+    Match every blend of two songs from weight 0 to 100 against the catalog.
+    The pair is loaded, resampled and normalized once; blends are mixed and
+    fingerprinted in parallel without writing any WAV files.
+    Each blend is scored like SongMatcher scores a query: with the cascade's fine signature
+    (including augmented variants) when the catalog has signatures, otherwise with the pHash
+    character metric. Stem routing, coarse pruning and early exit are skipped, so every entry
+    with signatures is scored on the fine scale at every weight and the curves only move with
+    the blend.
+    :param all_signatures: {song_name: {file_type: {"coarse", "fine"}}} catalog signatures.
+    :param all_augmented: Distorted variants of the catalog entries, as passed to SongMatcher.
+    :param step: Weight increment between blends.
+    :param duration: Seconds of each blend that are fingerprinted (the app uses the first 30).
+    :param scheduler: ResourceScheduler admitting each blend as background work (default: the shared one).
+    :return: (weights, table) where table rows are (song_name, file_type, [similarity per weight]),
+             ordered by their best similarity over the sweep.
+    """
+    weights = list(range(0, 101, step))
+    if weights[-1] != 100:
+        weights.append(100)
+
+    mixer = SongMixer(filepath01=filepath01, filepath02=filepath02)
+    # Only the fingerprinted window needs to be shipped to the workers
+    frames = int(duration * mixer.samplerate)
+    mixer.audio01 = mixer.audio01[:frames]
+    mixer.audio02 = mixer.audio02[:frames]
+
+    scheduler = scheduler or get_scheduler()
+    # A blend holds the mixed float32 signal plus its spectrogram work in the worker
+    blend_bytes = max(mixer.audio01.size, mixer.audio02.size) * 4 * DECODE_OVERHEAD
+    blends = [None] * len(weights)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(mixer,)) as executor:
+        admitted = scheduler.map_admitted(
+            executor, INGEST, [(blend_bytes, _fingerprint_blend, (weight,)) for weight in weights],
+            workers or os.cpu_count() or 1
+        )
+        for index, future in admitted:
+            blends[index] = future.result()
+
+    failed = [
+        weight for weight, (fingerprint, signatures) in zip(weights, blends)
+        if not fingerprint or (all_signatures and not signatures)
+    ]
+    if failed:
+        raise ValueError(f"Failed to fingerprint blends at weights: {failed}")
+
+    rankings = []
+    for fingerprint, signatures in blends:
+        if all_signatures:
+            # Keep every entry so no cell falls back to the 64-bit pHash scale
+            rankings.append(score_cascade(
+                fingerprint, signatures, all_fingerprints, all_signatures, augmented=all_augmented, keep_ratio=1.0
+            )[0])
+        else:
+            rankings.append(score_fingerprints(fingerprint, all_fingerprints, all_augmented))
+
+    curves = {}
+    for column, ranking in enumerate(rankings):
+        for song_name, similarity, file_type in ranking:
+            curves.setdefault((song_name, file_type), [0.0] * len(weights))[column] = similarity
+
+    table = [(song_name, file_type, curve) for (song_name, file_type), curve in curves.items()]
+    table.sort(key=lambda row: max(row[2]), reverse=True)
+    return weights, table
+
+
+def write_sweep_csv(weights, table, output_path):
+    """Write the similarity-vs-weight table as CSV, one catalog entry per row."""
+    with open(output_path, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["Song Name", "Song Type"] + [f"{weight}%" for weight in weights])
+        for song_name, file_type, curve in table:
+            writer.writerow([song_name, file_type] + [f"{similarity:.4f}" for similarity in curve])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Match a full 0-100 blend curve of two songs against the catalog.")
+    parser.add_argument("first_song", help="Audio file weighted by the sweep value")
+    parser.add_argument("second_song", help="Audio file weighted by 100 minus the sweep value")
+    parser.add_argument("--step", type=int, default=1, help="Weight increment between blends")
+    parser.add_argument("--workers", type=int, default=None, help="Number of fingerprinting processes")
+    parser.add_argument("--base-path", default="static/songs", help="Song catalog folder")
+    parser.add_argument("--output", default="weight_sweep.csv", help="CSV file to write")
+    args = parser.parse_args()
+
+    # Imported here so the sweep functions do not depend on the ingestion service
+    from app.services.files_setup import FeatureFoldersProcessor
+
+    service = FeatureFoldersProcessor(base_path=args.base_path)
+    snapshot = service.snapshot
+    weights, table = sweep_weights(
+        args.first_song, args.second_song, snapshot.fingerprints, snapshot.signatures, snapshot.augmented,
+        step=args.step, workers=args.workers
+    )
+    write_sweep_csv(weights, table, args.output)
+    print(f"Wrote {len(table)} entries x {len(weights)} weights to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
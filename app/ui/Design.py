@@ -1,5 +1,7 @@
 from PyQt5 import QtCore, QtGui, QtWidgets
 
+from app.ui.similarity_table_model import SimilarityTableModel, SORT_ROLE
+
 # ------------------------------------------------------------------------
 #                           Global Constants
 # ------------------------------------------------------------------------
@@ -18,6 +20,16 @@ BUTTON_STYLE = """
         background-color: rgba(255, 255, 255, 10);
     }
 """
+LINE_EDIT_STYLE = f"""
+    QLineEdit {{
+        color: {SECONDARY_COLOR};
+        background-color: rgba(255, 255, 255, 0);
+        border: 1px solid {SECONDARY_COLOR};
+        font-family: Didot;
+        font-size: 14px;
+        padding: 6px;
+    }}
+"""
 LABEL_WHITE_TEXT = f"color:{SECONDARY_COLOR}"
 GROUPBOX_WHITE_TEXT = f"color:{SECONDARY_COLOR}"
 
@@ -58,7 +70,7 @@ SLIDER_STYLESHEET = """
             }
 """
 TABLE_STYLESHEET = f"""
-    QTableWidget {{
+    QTableView {{
         background-color: {MAIN_COLOR};
         color: {SECONDARY_COLOR};
         gridline-color: #D3D3D3;
@@ -76,7 +88,7 @@ TABLE_STYLESHEET = f"""
         padding: 8px;
         border: 1px solid {MAIN_COLOR};
     }}
-    QTableWidget::item {{
+    QTableView::item {{
         border: 1px solid #D3D3D3;
         padding: 6px;
         font-family: Didot;
@@ -203,29 +215,49 @@ class Ui_MainWindow(object):
         return plot_widget
 
     def create_table(self, group_box):
-        table_widget = QtWidgets.QTableWidget()
-        table_widget.setColumnCount(4)  # Number of columns
-        table_widget.setHorizontalHeaderLabels([
-            "Song Name", "Similarity Index (%)", "Song Type", "Match Status"
-        ])
+        self.table_model = SimilarityTableModel()
+
+        # Proxy model sorts/filters on top of the model without touching its rows
+        self.table_proxy_model = QtCore.QSortFilterProxyModel()
+        self.table_proxy_model.setSourceModel(self.table_model)
+        self.table_proxy_model.setSortRole(SORT_ROLE)
+        self.table_proxy_model.setFilterKeyColumn(0)
+        self.table_proxy_model.setFilterCaseSensitivity(QtCore.Qt.CaseInsensitive)
+
+        table_view = QtWidgets.QTableView()
+        table_view.setModel(self.table_proxy_model)
 
-        table_widget.setStyleSheet(TABLE_STYLESHEET)
-        table_widget.horizontalHeader().setStretchLastSection(True)
-        table_widget.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
+        table_view.setStyleSheet(TABLE_STYLESHEET)
+        table_view.horizontalHeader().setStretchLastSection(True)
+        table_view.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
 
         # Adjust row headers
-        table_widget.verticalHeader().setVisible(True)
-        table_widget.verticalHeader().setStyleSheet(f"color: {SECONDARY_COLOR}; font-size: 14px; font-family: Didot;")
+        table_view.verticalHeader().setVisible(True)
+        table_view.verticalHeader().setStyleSheet(f"color: {SECONDARY_COLOR}; font-size: 14px; font-family: Didot;")
+        # Fixed row heights let the view skip measuring rows it does not paint
+        table_view.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
 
         # Make cells read-only
-        table_widget.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        table_view.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+
+        # Highest similarity first by default
+        table_view.setSortingEnabled(True)
+        table_view.sortByColumn(1, QtCore.Qt.DescendingOrder)
+
+        # Song name filter applied by the proxy model
+        self.table_filter_input = QtWidgets.QLineEdit()
+        self.table_filter_input.setObjectName("table_filter_input")
+        self.table_filter_input.setPlaceholderText("Filter by song name")
+        self.table_filter_input.setClearButtonEnabled(True)
+        self.table_filter_input.setStyleSheet(LINE_EDIT_STYLE)
 
         # Layout for the table
         table_layout = QtWidgets.QVBoxLayout()
-        table_layout.addWidget(table_widget)
+        table_layout.addWidget(self.table_filter_input)
+        table_layout.addWidget(table_view)
         group_box.setLayout(table_layout)
 
-        return table_widget
+        return table_view
 
     # ------------------------------------------------------------------------
     #                           UI SETUP HELPERS
@@ -425,7 +457,7 @@ class Ui_MainWindow(object):
         self.recognized_song_index_groupBox.setObjectName("recognized_song_index_groupBox")
         self.recognized_song_index_groupBox.setTitle("Similarity Index")  # GroupBox title set directly
 
-        self.table_widget = self.create_table(self.recognized_song_index_groupBox)
+        self.table_view = self.create_table(self.recognized_song_index_groupBox)
 
     def setup_recognized_song_data(self):
         self.recognized_song_data_groupBox = QtWidgets.QGroupBox(self.centralwidget)
@@ -481,32 +513,21 @@ class Ui_MainWindow(object):
     #                           Actions
     # ------------------------------------------------------------------------
 
-    def add_row_to_index_table(self, song_name, similarity_index, song_type):
-        new_row_index = self.table_widget.rowCount()
-
-        # Format similarity index to remove decimals
-        similarity_value = float(similarity_index.strip('%'))  # Convert '80%' to 80.0
-        similarity_index = f"{int(similarity_value)}%"  # Remove decimals
-
-        # Determine match status
-        if similarity_value >= 80:
-            match_status = "High"
-        elif 50 <= similarity_value < 80:
-            match_status = "Moderate"
-        else:
-            match_status = "Low"
-
-        # Replace underscores with spaces in song name
-        song_name = song_name.replace("_", " ")
+    def set_index_table_data(self, similarity_list, refined=None):
+        """
+        Replace the table content with (song_name, similarity, song_type) tuples in one pass.
+        Rows missing from `refined` (when given) are marked as pruned by the coarse pass.
+        """
+        self.table_model.set_rows(similarity_list, refined=refined)
 
-        self.table_widget.insertRow(new_row_index)
-        self.table_widget.setItem(new_row_index, 0, QtWidgets.QTableWidgetItem(song_name))
-        self.table_widget.setItem(new_row_index, 1, QtWidgets.QTableWidgetItem(similarity_index))
-        self.table_widget.setItem(new_row_index, 2, QtWidgets.QTableWidgetItem(song_type))
-        self.table_widget.setItem(new_row_index, 3, QtWidgets.QTableWidgetItem(match_status))
+    def filter_index_table(self, text):
+        """
+        Show only rows whose song name contains the given text.
+        """
+        self.table_proxy_model.setFilterFixedString(text)
 
     def clear_index_table_data(self):
-        self.table_widget.setRowCount(0)
+        self.table_model.clear()
 
     def update_song_weight_slider_label(self):
         value = self.songs_weight_slider.value()
@@ -0,0 +1,97 @@
+from PyQt5 import QtCore
+
+# Role used by the proxy model to sort on raw values instead of display strings
+SORT_ROLE = QtCore.Qt.UserRole
+
+TABLE_HEADERS = ["Song Name", "Similarity Index (%)", "Song Type", "Match Status"]
+
+# Status thresholds (%) on the bitwise similarity scale, where unrelated songs score about 50%
+HIGH_MATCH = 80
+MODERATE_MATCH = 65
+
+
+class SimilarityTableModel(QtCore.QAbstractTableModel):
+    """
+    Table model holding the similarity results as a flat list of rows.
+    The view only asks for the cells it is currently painting, so no widget
+    is created per row and large result sets are cheap to (re)populate.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []  # (song_name, similarity_value, song_type, match_status)
+
+    # ------------------------------------------------------------------------
+    #                           Qt Model Interface
+    # ------------------------------------------------------------------------
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(TABLE_HEADERS)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        row = self._rows[index.row()]
+        column = index.column()
+
+        if role == QtCore.Qt.DisplayRole:
+            if column == 1:
+                return f"{int(row[1])}%"  # Remove decimals
+            return row[column]
+        if role == SORT_ROLE:
+            if column == 1 and row[3] == "Pruned":
+                # 64-bit pHash scores are not comparable with refined ones; keep them below every refined row
+                return row[1] - 100
+            return row[column]
+        return None
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if orientation == QtCore.Qt.Horizontal:
+            return TABLE_HEADERS[section]
+        return str(section + 1)
+
+    # ------------------------------------------------------------------------
+    #                           Data Helpers
+    # ------------------------------------------------------------------------
+    def set_rows(self, rows, refined=None):
+        """
+        Replace all rows at once.
+        :param rows: Iterable of (song_name, similarity, song_type) with similarity in [0, 1].
+        :param refined: Optional set of (song_name, song_type) the cascade re-ranked with the fine
+                        signature; the other rows were pruned by the coarse pass and are marked so.
+        """
+        self.beginResetModel()
+        self._rows = [
+            self._format_row(
+                song_name, similarity * 100, song_type,
+                pruned=refined is not None and (song_name, song_type) not in refined
+            )
+            for song_name, similarity, song_type in rows
+        ]
+        self.endResetModel()
+
+    def clear(self):
+        self.beginResetModel()
+        self._rows = []
+        self.endResetModel()
+
+    @staticmethod
+    def _format_row(song_name, similarity_value, song_type, pruned=False):
+        # Determine match status
+        if pruned:
+            # Only scored with the 64-bit pHash, not comparable to the refined rows
+            match_status = "Pruned"
+        elif similarity_value >= HIGH_MATCH:
+            match_status = "High"
+        elif MODERATE_MATCH <= similarity_value < HIGH_MATCH:
+            match_status = "Moderate"
+        else:
+            match_status = "Low"
+
+        # Replace underscores with spaces in song name
+        return song_name.replace("_", " "), float(similarity_value), song_type, match_status
@@ -0,0 +1,36 @@
+import os
+import json
+import tempfile
+
+
+def atomic_write_json(file_path, data, indent=4):
+    """
+    Write JSON so readers see either the old file or the complete new one, never a partial file.
+    The data goes to a temporary file in the same directory, is fsynced, then renamed over the target.
+    """
+    directory = os.path.dirname(file_path) or "."
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as json_file:
+            json.dump(data, json_file, indent=indent)
+            json_file.flush()
+            os.fsync(json_file.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def load_json(file_path, default=None):
+    """
+    Load a JSON file, returning `default` if it is missing or unreadable (e.g. truncated by a crash).
+    """
+    if not os.path.exists(file_path):
+        return default
+    try:
+        with open(file_path, "r") as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError) as e:
+        print(f"[Error] Ignoring unreadable file {file_path}: {e}")
+        return default
@@ -0,0 +1,48 @@
+import numpy as np
+
+# Single precision is plenty for 16/24-bit PCM and halves memory and bandwidth
+AUDIO_DTYPE = np.float32
+
+
+def as_audio_dtype(array):
+    """
+    Cast an array to the audio dtype, without copying if it already has it.
+    """
+    return np.asarray(array).astype(AUDIO_DTYPE, copy=False)
+
+
+def check_dtype_accuracy(file_path, feature_tolerance=1e-3, max_hash_bits=2):
+    """
+    Run the feature/hash pipeline on one file in float64 and in AUDIO_DTYPE and
+    report whether the outputs agree within tolerance.
+    :return: Dict with the largest feature difference, the pHash bit distance and a 'passed' flag.
+    """
+    # Imported here to keep this module free of the heavy audio dependencies
+    from app.models.feature_extractor import FeatureExtractor
+    from app.models.fingerprint_matcher import hamming_similarity
+
+    extractor = FeatureExtractor()
+    outputs = {}
+    for dtype in (np.float64, AUDIO_DTYPE):
+        spectrogram, sr = extractor.generate_mel_spectrogram(file_path, dtype=dtype)
+        if spectrogram is None:
+            raise ValueError(f"Failed to generate spectrogram for file: {file_path}")
+        outputs[dtype] = (
+            extractor.extract_features(spectrogram, sr),
+            extractor.generate_perceptual_hash(spectrogram)
+        )
+
+    features64, hash64 = outputs[np.float64]
+    features32, hash32 = outputs[AUDIO_DTYPE]
+
+    max_feature_diff = max(
+        (abs(features64[key] - features32.get(key, np.inf)) for key in features64),
+        default=0.0
+    )
+    hash_bits = round((1 - hamming_similarity(hash64, hash32)) * len(hash64) * 4)
+
+    return {
+        "max_feature_diff": float(max_feature_diff),
+        "hash_bit_distance": hash_bits,
+        "passed": max_feature_diff <= feature_tolerance and hash_bits <= max_hash_bits,
+    }
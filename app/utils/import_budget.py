@@ -0,0 +1,49 @@
+import subprocess
+import sys
+
+# Modules that must stay out of the start-up import graph (loaded on first use instead)
+DEFERRED_MODULES = ("librosa", "matplotlib", "imagehash", "scipy.signal")
+
+# Wall-clock budget for importing the application entry point, in seconds
+STARTUP_IMPORT_BUDGET = 1.5
+
+
+def measure_import(module="app.controller"):
+    """
+    Import `module` in a fresh interpreter and report the elapsed time and which
+    deferred heavy modules ended up loaded.
+    """
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"loaded = [name for name in {DEFERRED_MODULES!r} if name in sys.modules]\n"
+        "print(elapsed)\n"
+        "print(','.join(loaded))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout.splitlines()
+    return float(output[0]), [name for name in output[1].split(",") if name]
+
+
+def check_import_budget(module="app.controller", budget=STARTUP_IMPORT_BUDGET):
+    """
+    Raise RuntimeError if importing `module` exceeds the budget or pulls in a deferred dependency.
+    """
+    elapsed, loaded = measure_import(module)
+    if loaded:
+        raise RuntimeError(f"Importing {module} eagerly loads: {', '.join(loaded)}")
+    if elapsed > budget:
+        raise RuntimeError(f"Importing {module} took {elapsed:.2f}s (budget {budget:.2f}s)")
+    return elapsed
+
+
+if __name__ == "__main__":
+    try:
+        seconds = check_import_budget()
+    except RuntimeError as e:
+        print(f"[Error] {e}")
+        sys.exit(1)
+    print(f"Start-up imports took {seconds:.2f}s (budget {STARTUP_IMPORT_BUDGET:.2f}s)")
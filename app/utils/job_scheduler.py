@@ -0,0 +1,174 @@
+import os
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from contextlib import contextmanager
+
+from app.utils.wav_reader import open_mapped_wav
+
+# Job kinds, in priority order: interactive queries are admitted before background indexing
+QUERY = "query"
+INGEST = "ingest"
+PRIORITIES = {QUERY: 0, INGEST: 1}
+
+DEFAULT_MEMORY_BUDGET = 1024 * 1024 * 1024
+
+# Peak memory of decoding + STFT/mel relative to the float32 signal itself
+DECODE_OVERHEAD = 4
+# Bytes of decoded float32 audio per byte of compressed input when the header cannot be read
+COMPRESSED_EXPANSION = 12
+
+
+def estimate_decode_bytes(file_path, duration=30):
+    """
+    Estimate the peak memory of decoding `duration` seconds of a file and building its spectrogram.
+    """
+    wav = open_mapped_wav(file_path)
+    if wav is not None:
+        frames, channels = wav.frames, wav.channels
+        samplerate = wav.samplerate
+    else:
+        try:
+            import soundfile as sf
+            info = sf.info(file_path)
+            frames, channels, samplerate = info.frames, info.channels, info.samplerate
+        except Exception:
+            # No readable header (e.g. formats only the fallback decoder handles): estimate from the
+            # file size; missing files reserve nothing and fail in the decoder itself
+            size = os.path.getsize(file_path) if os.path.isfile(file_path) else 0
+            return size * COMPRESSED_EXPANSION * DECODE_OVERHEAD
+
+    if duration is not None:
+        frames = min(frames, int(duration * samplerate))
+    return frames * channels * 4 * DECODE_OVERHEAD
+
+
+class ResourceScheduler:
+    """
+    Admits decode jobs by their estimated memory so concurrent ingestion and queries
+    stay within a shared budget. Waiting jobs are admitted strictly in priority order
+    (queries first, then first come first served), and a job larger than the whole
+    budget still runs once nothing else is running.
+    """
+
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET):
+        self.memory_budget = memory_budget
+        self._condition = threading.Condition()
+        self._waiting = []  # heap of (priority, sequence)
+        self._sequence = itertools.count()
+        self._used = 0
+        self._running = 0
+        self._stats = {kind: {"admitted": 0, "total_wait": 0.0, "max_wait": 0.0} for kind in PRIORITIES}
+        self._queued = {kind: 0 for kind in PRIORITIES}
+
+    def _can_admit(self, ticket, estimated_bytes):
+        if not self._waiting or self._waiting[0] != ticket:
+            return False
+        return self._running == 0 or self._used + estimated_bytes <= self.memory_budget
+
+    @contextmanager
+    def admit(self, kind, estimated_bytes):
+        """
+        Block until the job fits in the budget and is at the head of the queue, then run the body.
+        """
+        if kind not in PRIORITIES:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        ticket = (PRIORITIES[kind], next(self._sequence))
+        start = time.perf_counter()
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            self._queued[kind] += 1
+            self._condition.wait_for(lambda: self._can_admit(ticket, estimated_bytes))
+            heapq.heappop(self._waiting)
+            self._queued[kind] -= 1
+            self._used += estimated_bytes
+            self._running += 1
+
+            waited = time.perf_counter() - start
+            stats = self._stats[kind]
+            stats["admitted"] += 1
+            stats["total_wait"] += waited
+            stats["max_wait"] = max(stats["max_wait"], waited)
+            # The next ticket may fit alongside this one
+            self._condition.notify_all()
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._used -= estimated_bytes
+                self._running -= 1
+                self._condition.notify_all()
+
+    def run(self, kind, estimated_bytes, function, *args, **kwargs):
+        """Run `function` once admitted and return its result."""
+        with self.admit(kind, estimated_bytes):
+            return function(*args, **kwargs)
+
+    def submit(self, executor, kind, estimated_bytes, function, *args):
+        """
+        Submit `function` to `executor` (e.g. a process pool) once admitted; the memory stays
+        reserved until the job finishes in the pool.
+        """
+        admission = self.admit(kind, estimated_bytes)
+        admission.__enter__()
+        try:
+            future = executor.submit(function, *args)
+        except BaseException:
+            admission.__exit__(None, None, None)
+            raise
+        future.add_done_callback(lambda _: admission.__exit__(None, None, None))
+        return future
+
+    def map_admitted(self, executor, kind, jobs, max_in_flight):
+        """
+        Submit (estimated_bytes, function, args) jobs to `executor`, each once admitted and with
+        at most `max_in_flight` in the pool at a time, so bulk work never queues its whole
+        input (or its memory) at once.
+        :return: Iterator of (job_index, future) in completion order.
+        """
+        pending = {}
+        for index, (estimated_bytes, function, args) in enumerate(jobs):
+            while len(pending) >= max_in_flight:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future
+            pending[self.submit(executor, kind, estimated_bytes, function, *args)] = index
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future
+
+    def stats(self):
+        """Queue depth, running jobs, reserved memory and wait times per job kind."""
+        with self._condition:
+            return {
+                "memory_budget": self.memory_budget,
+                "memory_reserved": self._used,
+                "running": self._running,
+                "queue_depth": dict(self._queued),
+                "jobs": {
+                    kind: {
+                        "admitted": stats["admitted"],
+                        "mean_wait": stats["total_wait"] / stats["admitted"] if stats["admitted"] else 0.0,
+                        "max_wait": stats["max_wait"],
+                    }
+                    for kind, stats in self._stats.items()
+                },
+            }
+
+
+_default_scheduler = None
+_default_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Process-wide scheduler shared by ingestion and query code."""
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = ResourceScheduler()
+        return _default_scheduler
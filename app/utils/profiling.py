@@ -0,0 +1,103 @@
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+# Setting this environment variable to a directory turns profiling on
+PROFILE_DIR_ENV = "SOUNDPRINTS_PROFILE_DIR"
+
+TOP_FUNCTIONS = 30
+TOP_ALLOCATORS = 20
+
+_profile_dir = None
+_active = threading.local()
+# cProfile allows one active profiler per process
+_profiler_lock = threading.Lock()
+
+
+def enable_profiling(directory):
+    """Turn profiling on for every @profiled operation, writing reports to `directory`."""
+    global _profile_dir
+    os.makedirs(directory, exist_ok=True)
+    _profile_dir = directory
+
+
+def profile_directory():
+    """The configured report directory (CLI flag first, then environment), or None when disabled."""
+    return _profile_dir or os.environ.get(PROFILE_DIR_ENV) or None
+
+
+def _write_report(directory, operation, profiler, snapshot, peak, elapsed):
+    stamp = time.strftime("%Y%m%d-%H%M%S") + f"-{int(time.time() * 1000) % 1000:03d}"
+    base_name = os.path.join(directory, f"{operation}-{stamp}")
+
+    # Raw stats, loadable with pstats or snakeviz
+    profiler.dump_stats(f"{base_name}.prof")
+
+    stats_buffer = io.StringIO()
+    pstats.Stats(profiler, stream=stats_buffer).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+
+    lines = [
+        f"Operation: {operation}",
+        f"Wall time: {elapsed:.3f} s",
+        f"Peak traced memory: {peak / (1024 * 1024):.2f} MiB",
+        "",
+        f"Top {TOP_ALLOCATORS} allocators still held at the end (by line):",
+    ]
+    for stat in snapshot.statistics("lineno")[:TOP_ALLOCATORS]:
+        lines.append(f"  {stat}")
+    lines += ["", "CPU profile (cumulative):", stats_buffer.getvalue()]
+
+    with open(f"{base_name}.txt", "w") as report:
+        report.write("\n".join(lines))
+
+
+def profiled(operation):
+    """
+    Decorator that, when profiling is enabled, runs the call under cProfile and tracemalloc
+    and writes a per-call report (<operation>-<timestamp>.prof / .txt) to the profile directory.
+    When disabled it costs one environment lookup per call.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            directory = profile_directory()
+            # Nested or concurrent profiled calls run unprofiled inside the outer report
+            if not directory or getattr(_active, "running", False) or not _profiler_lock.acquire(blocking=False):
+                return function(*args, **kwargs)
+
+            _active.running = True
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            try:
+                profiler.enable()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    profiler.disable()
+                    elapsed = time.perf_counter() - start
+                    _, peak = tracemalloc.get_traced_memory()
+                    snapshot = tracemalloc.take_snapshot().filter_traces((
+                        tracemalloc.Filter(False, __file__),
+                        tracemalloc.Filter(False, tracemalloc.__file__),
+                    ))
+                    if started_tracing:
+                        tracemalloc.stop()
+                    try:
+                        os.makedirs(directory, exist_ok=True)
+                        _write_report(directory, operation, profiler, snapshot, peak, elapsed)
+                    except Exception as e:
+                        print(f"[Error] Failed to write profile report for {operation}: {e}")
+            finally:
+                _active.running = False
+                _profiler_lock.release()
+        return wrapper
+    return decorator
@@ -0,0 +1,119 @@
+import os
+import struct
+import numpy as np
+
+from app.utils.dtype_policy import AUDIO_DTYPE
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# (format, bits per sample) -> (on-disk dtype, offset, scale) used to convert to [-1.0, 1.0]
+SAMPLE_LAYOUTS = {
+    (WAVE_FORMAT_PCM, 8): (np.dtype("u1"), 128.0, 128.0),
+    (WAVE_FORMAT_PCM, 16): (np.dtype("<i2"), 0.0, 32768.0),
+    (WAVE_FORMAT_PCM, 32): (np.dtype("<i4"), 0.0, 2147483648.0),
+    (WAVE_FORMAT_IEEE_FLOAT, 32): (np.dtype("<f4"), 0.0, 1.0),
+    (WAVE_FORMAT_IEEE_FLOAT, 64): (np.dtype("<f8"), 0.0, 1.0),
+}
+
+
+class MappedWav:
+    """
+    Memory-mapped view over the data chunk of a PCM/float WAV file.
+    Slicing a window touches only the pages of the requested frames, and only
+    those frames are converted to float.
+    Raises ValueError for files this reader cannot map (e.g. mp3 or 24-bit PCM),
+    so callers can fall back to a regular decoder.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        audio_format, self.channels, self.samplerate, bits, data_offset, data_size = self._parse_header(file_path)
+
+        layout = SAMPLE_LAYOUTS.get((audio_format, bits))
+        if layout is None:
+            raise ValueError(f"Unsupported WAV sample format {audio_format}/{bits}-bit: {file_path}")
+        self.sample_dtype, self._offset, self._scale = layout
+
+        # Streamed writers may leave a placeholder size; never map past the end of the file
+        data_size = min(data_size, os.path.getsize(file_path) - data_offset)
+        frame_bytes = self.sample_dtype.itemsize * self.channels
+        self.frames = data_size // frame_bytes
+        self._data = np.memmap(
+            file_path, dtype=self.sample_dtype, mode="r",
+            offset=data_offset, shape=(self.frames, self.channels)
+        ) if self.frames else np.empty((0, self.channels), dtype=self.sample_dtype)
+
+    @property
+    def duration(self):
+        return self.frames / self.samplerate
+
+    @staticmethod
+    def _parse_header(file_path):
+        """Walk the RIFF chunks and return the format fields and the data chunk location."""
+        fmt = None
+        with open(file_path, "rb") as f:
+            riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+            if riff != b"RIFF" or wave != b"WAVE":
+                raise ValueError(f"Not a RIFF/WAVE file: {file_path}")
+
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    break
+                chunk_id, chunk_size = struct.unpack("<4sI", header)
+
+                if chunk_id == b"fmt ":
+                    chunk = f.read(chunk_size)
+                    audio_format, channels, samplerate, _, _, bits = struct.unpack("<HHIIHH", chunk[:16])
+                    if audio_format == WAVE_FORMAT_EXTENSIBLE and len(chunk) >= 26:
+                        # The real format is the first two bytes of the sub-format GUID
+                        audio_format = struct.unpack("<H", chunk[24:26])[0]
+                    fmt = (audio_format, channels, samplerate, bits)
+                elif chunk_id == b"data":
+                    if fmt is None:
+                        raise ValueError(f"WAV data chunk precedes fmt chunk: {file_path}")
+                    return (*fmt, f.tell(), chunk_size)
+                else:
+                    f.seek(chunk_size, 1)
+
+                # Chunks are word aligned
+                if chunk_size % 2:
+                    f.seek(1, 1)
+
+        raise ValueError(f"WAV file has no data chunk: {file_path}")
+
+    def read(self, start=0, frames=None, dtype=AUDIO_DTYPE, mono=False):
+        """
+        Read `frames` frames starting at frame `start`.
+        :return: (frames,) array for mono output, otherwise (frames, channels) like soundfile.
+        """
+        stop = self.frames if frames is None else min(self.frames, start + frames)
+        window = self._data[start:stop]
+
+        audio = window.astype(dtype)
+        if self._offset:
+            audio -= self._offset
+        if self._scale != 1.0:
+            audio /= self._scale
+
+        if mono:
+            return audio.mean(axis=1) if self.channels > 1 else audio[:, 0]
+        return audio[:, 0] if self.channels == 1 else audio
+
+    def read_seconds(self, offset=0.0, duration=None, dtype=AUDIO_DTYPE, mono=False):
+        """Read a window given in seconds."""
+        start = int(offset * self.samplerate)
+        frames = None if duration is None else int(duration * self.samplerate)
+        return self.read(start, frames, dtype=dtype, mono=mono)
+
+
+def open_mapped_wav(file_path):
+    """Return a MappedWav for the file, or None if it cannot be memory-mapped."""
+    if not file_path.lower().endswith(".wav"):
+        return None
+    try:
+        return MappedWav(file_path)
+    except (ValueError, OSError, struct.error):
+        return None
@@ -0,0 +1,98 @@
+"""
+Ingestion benchmark: per-file CPU time of deriving features, fingerprint and signatures
+with the previous pyplot path against the SpectrogramAnalysis bundle.
+
+    python -m benchmarks.ingestion static/songs/*/*.wav
+"""
+import argparse
+import time
+from io import BytesIO
+
+from app.models.feature_extractor import FeatureExtractor
+
+
+def _render_with_pyplot(spectrogram):
+    """The pyplot hash-image renderer ingestion used before the bare Agg figure (the baseline)."""
+    import matplotlib.pyplot as plt
+    from PIL import Image
+
+    fig, ax = plt.subplots(figsize=(5, 5), dpi=100)
+    ax.axis('off')
+    ax.imshow(spectrogram, aspect='auto', origin='lower', cmap='viridis')
+    buf = BytesIO()
+    fig.savefig(buf, format='png', bbox_inches='tight', pad_inches=0)
+    plt.close(fig)
+    buf.seek(0)
+    image = Image.open(buf)
+    image.load()
+    buf.close()
+    return image
+
+
+def _separate_pass(extractor, spectrograms):
+    """(signatures, features, fingerprint) per spectrogram, derived by separate calls."""
+    outputs = []
+    for spectrogram, sr in spectrograms:
+        image = _render_with_pyplot(spectrogram)
+        outputs.append((
+            extractor.generate_signatures(spectrogram, image=image, sr=sr),
+            extractor.extract_features(spectrogram, sr),
+            extractor.generate_perceptual_hash(spectrogram, image=image),
+        ))
+    return outputs
+
+
+def _bundle_pass(extractor, spectrograms):
+    """(signatures, features, fingerprint) per spectrogram, read from one analysis bundle each."""
+    outputs = []
+    for spectrogram, sr in spectrograms:
+        analysis = extractor.analyze(spectrogram, sr)
+        analysis.render()
+        outputs.append((analysis.signatures, analysis.features, analysis.fingerprint))
+    return outputs
+
+
+def benchmark_analysis(file_paths, duration=30, repeats=3):
+    """
+    Compare per-file ingestion CPU time of the previous path (pyplot render, separate feature,
+    fingerprint and signature calls sharing the image) with the SpectrogramAnalysis bundle on
+    the same spectrograms. Decoding and the saved spectrogram plot are excluded.
+    The two paths alternate for `repeats` rounds and the fastest round of each is kept.
+    :return: CPU milliseconds per file for both paths and their speedup.
+    """
+    extractor = FeatureExtractor()
+    spectrograms = [extractor.generate_mel_spectrogram(file_path, duration=duration) for file_path in file_paths]
+    spectrograms = [(spectrogram, sr) for spectrogram, sr in spectrograms if spectrogram is not None]
+    if not spectrograms:
+        raise ValueError("No spectrograms could be generated for the benchmark files")
+
+    timings = {_separate_pass: [], _bundle_pass: []}
+    for _ in range(repeats):
+        for run_pass, cpu_times in timings.items():
+            start = time.process_time()
+            run_pass(extractor, spectrograms)
+            cpu_times.append(time.process_time() - start)
+    separate_cpu, bundle_cpu = min(timings[_separate_pass]), min(timings[_bundle_pass])
+
+    return {
+        "files": len(spectrograms),
+        "separate_ms_per_file": 1000 * separate_cpu / len(spectrograms),
+        "bundle_ms_per_file": 1000 * bundle_cpu / len(spectrograms),
+        "speedup": separate_cpu / bundle_cpu if bundle_cpu else float("inf"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-file ingestion CPU time of the pyplot path and the analysis bundle.")
+    parser.add_argument("files", nargs="+", help="Audio files to benchmark")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of each file to analyze")
+    parser.add_argument("--repeats", type=int, default=3, help="Alternating rounds per path; the fastest is kept")
+    args = parser.parse_args()
+
+    result = benchmark_analysis(args.files, duration=args.duration, repeats=args.repeats)
+    print(f"{result['files']} files: pyplot path {result['separate_ms_per_file']:.1f} ms/file, "
+          f"bundle {result['bundle_ms_per_file']:.1f} ms/file, speedup {result['speedup']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,23 @@
 import sys
+import argparse
 from app.controller import MainWindowController
+from app.utils.profiling import PROFILE_DIR_ENV, enable_profiling
 from PyQt5 import QtWidgets
 
 
 def main():
-    app = QtWidgets.QApplication(sys.argv)
-    main_window = MainWindowController(app)
+    parser = argparse.ArgumentParser(description="Soundprints")
+    parser.add_argument("--profile-dir",
+                        help=f"Write cProfile/tracemalloc reports per operation here (or set {PROFILE_DIR_ENV})")
+    parser.add_argument("--shards", type=int,
+                        help="Score queries across this many catalog shard processes")
+    # Remaining arguments are left for Qt
+    args, qt_args = parser.parse_known_args()
+    if args.profile_dir:
+        enable_profiling(args.profile_dir)
+
+    app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
+    main_window = MainWindowController(app, num_shards=args.shards)
     main_window.showFullScreen()
     sys.exit(app.exec_())
 